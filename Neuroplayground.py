@@ -1,22 +1,97 @@
 import pygame
+import os
 import sys
-import time
 import math
 import random
+import functools
 from pygame.locals import *
 pygame.init() # initialize pygame
 pygame.font.init()
 pygame.mixer.init()
 clock = pygame.time.Clock()
-bg = pygame.image.load('images/2.png')
-back = pygame.image.load('images/fs.png')
-back = pygame.transform.scale(back, (1000, 1000))  # scale to 500x400 pixels
-p1 = pygame.image.load('images/7.jpeg')
-gk1 = pygame.image.load('images/7.jpeg')
-p2 = pygame.image.load('images/8.jpeg')
-gk2 = pygame.image.load('images/8.jpeg')
-b = pygame.image.load('images/9.gif')
-bg_size = bg.get_size()
+
+# Assets are found relative to this file, so the game starts from any
+# working directory. Every image is loaded and converted to the display
+# format once at startup; nothing is read from disk during a match except
+# the streamed music.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (file in images/, preparation)
+#   'opaque' - convert(); also keeps a GIF's own colour key
+#   'alpha'  - convert_alpha()
+#   'key'    - JPEG sprite shot on grass: pixels close to the corner colour
+#              become transparent (JPEG noise rules out an exact colour key)
+IMAGES = {
+	'bg': ('2.png', 'opaque'),
+	'back': ('fs.PNG', 'alpha'),
+	'red': ('7.jpeg', 'key'),
+	'blue': ('8.jpeg', 'key'),
+	'ball': ('9.gif', 'opaque'),
+	'scored': ('3.png', 'opaque'),
+	'penalty': ('11.jpg', 'opaque'),
+	'controls': ('controls.jpeg', 'opaque'),
+}
+# name -> file in sounds/, played through pygame.mixer.music
+MUSIC = {
+	'intro': 'ipl.wav',
+	'whistle': 'whistle.wav',
+	'crowd': 'crowd.wav',
+}
+KEY_TOLERANCE = 48
+
+# Fail before the window opens if any image is missing, naming all of them
+def load_images():
+	paths = {name: os.path.join(BASE_DIR, 'images', file) for name, (file, _) in IMAGES.items()}
+	missing = [path for path in paths.values() if not os.path.isfile(path)]
+	if missing:
+		raise FileNotFoundError('Missing game images: ' + ', '.join(missing))
+	return {name: pygame.image.load(path) for name, path in paths.items()}
+
+# Needs the display mode to be set
+def prepare_images(images):
+	for name, (file, mode) in IMAGES.items():
+		surface = images[name]
+		if mode == 'key':
+			key = surface.get_at((0, 0))
+			mask = pygame.mask.from_threshold(surface, key, (KEY_TOLERANCE, KEY_TOLERANCE, KEY_TOLERANCE, 255))
+			surface = surface.convert_alpha()
+			mask.to_surface(surface, setcolor=(0, 0, 0, 0), unsetcolor=None)
+		elif mode == 'alpha':
+			surface = surface.convert_alpha()
+		else:
+			surface = surface.convert()
+		images[name] = surface
+
+# Music tracks that are missing are reported once and then stay silent,
+# since the game is playable without them
+def find_music():
+	music = {}
+	for name, file in MUSIC.items():
+		path = os.path.join(BASE_DIR, 'sounds', file)
+		if os.path.isfile(path):
+			music[name] = path
+		else:
+			print(f"Missing sound {path}, playing without it")
+	return music
+
+def play_music(name, loops=0):
+	if name in music:
+		pygame.mixer.music.load(music[name])
+		pygame.mixer.music.play(loops)
+
+images = load_images()
+music = find_music()
+bg_size = images['bg'].get_size()
+screen = pygame.display.set_mode([bg_size[0],bg_size[1] + 50])
+pygame.display.set_caption('SoccerLeague')
+images['back'] = pygame.transform.smoothscale(images['back'], (1000, 1000))
+prepare_images(images)
+bg = images['bg']
+back = images['back']
+p1 = gk1 = images['red']
+p2 = gk2 = images['blue']
+b = images['ball']
+sprites = {'b': b, 'p1': p1, 'p2': p2, 'gk1': gk1, 'gk2': gk2}
 gk2_rect = gk2.get_rect()
 gk1_rect = gk1.get_rect()
 gk2_x = 949
@@ -25,8 +100,6 @@ gk1_x = 43
 gk1_y = 309
 gk2_rect.center = gk2_x, gk2_y
 gk1_rect.center = gk1_x, gk1_y
-screen = pygame.display.set_mode([bg_size[0],bg_size[1] + 50])
-pygame.display.set_caption('SoccerLeague')
 back_rect = back.get_rect()
 back_rect.center = 500,250
 screen.blit(back, back_rect)
@@ -66,6 +139,11 @@ p2_rect.center = p2_x,p2_y
 connect = 0
 prev = new = 0 
 pk = 1
+match_time = 0
+score = 0
+hit = 0
+pk_x = pk_y = 0
+pk_count = 0
 r = (200,0,0)
 green = (0,200,0)
 orange = (255,127,0)
@@ -74,6 +152,145 @@ bright_r = (255,0,0)
 bright_green = (0,255,0)
 bright_orange = (255,215,0)
 
+# Fonts and rendered text, cached by font, size, text and colours. The
+# surfaces are shared between callers, so they must only be blitted. Asking
+# for the same text again returns the same surface, which also lets
+# render_frame() leave an unchanged scoreboard alone.
+FONT = 'freesansbold.ttf'
+
+@functools.lru_cache(maxsize=None)
+def get_font(name, size):
+	return pygame.font.Font(name, size)
+
+@functools.lru_cache(maxsize=256)
+def render_text(name, size, text, colour, background=None):
+	return get_font(name, size).render(text, True, colour, background)
+
+# Dirty-rectangle renderer for the match screen. Remembers the rect each
+# sprite and text item was drawn at last frame; only items that moved or
+# changed surface get the field restored under their old and new rects, and
+# only those regions are flipped.
+field = pygame.Surface(screen.get_size())
+field.fill(black)
+field.blit(bg, (0, 0))
+drawn = {}
+full_redraw = True
+
+# Next render_frame() repaints and flips the whole window, after something
+# else (goal overlay, menu) has drawn over the match
+def render_reset():
+	global full_redraw
+	full_redraw = True
+
+# items: (name, surface, rect) in drawing order
+def render_frame(items):
+	global drawn, full_redraw
+	current = {}
+	dirty = []
+	for name, surface, rect in items:
+		rect = rect.copy()
+		current[name] = (surface, rect)
+		last = drawn.get(name)
+		if last is None or last[0] is not surface or last[1] != rect:
+			if last is not None and last[1] != rect:
+				dirty.append(last[1])
+			dirty.append(rect)
+	for name in drawn:
+		if name not in current:
+			dirty.append(drawn[name][1])
+	if full_redraw:
+		screen.blit(field, (0, 0))
+		for name, surface, rect in items:
+			screen.blit(surface, rect)
+		pygame.display.update()
+	elif dirty:
+		# Repaint each damaged region from the field up, clipped to it, so
+		# overlapping regions never blend a translucent sprite twice
+		for area in dirty:
+			screen.set_clip(area)
+			screen.blit(field, area, area)
+			for name, surface, rect in items:
+				if area.colliderect(rect):
+					screen.blit(surface, rect)
+		screen.set_clip(None)
+		pygame.display.update(dirty)
+	drawn = current
+	full_redraw = False
+
+# Scenes. The game is always in exactly one scene, a function that start()
+# calls once per simulation step. goto() switches scene, optionally after a
+# delay in which the screen is left as it is. Events are drained and the
+# control keys tracked every frame whatever the scene, so the window stays
+# responsive and key presses are not lost during pauses.
+#
+# The simulation runs in fixed steps of STEP seconds: start() runs as many
+# steps as real time has covered, then draws one frame through the scene's
+# view, which places the sprites between their last two steps. Speeds are
+# per step and delays and the match clock are in simulated time, so a slow
+# frame no longer slows the game down and a faster frame rate does not
+# speed it up. view is None while the screen shows something static.
+SIM_RATE = 30
+STEP = 1 / SIM_RATE
+FPS = 60
+MAX_FRAME = 0.25    # longest stretch of real time simulated after a hitch
+scene = None
+view = None
+sim_time = 0
+resume_at = 0
+last_pos = {}
+
+def goto(next_scene, delay=0):
+	global scene, resume_at
+	scene = next_scene
+	resume_at = sim_time + delay
+
+def step():
+	global sim_time
+	sim_time += STEP
+	remember()
+	if sim_time >= resume_at:
+		scene()
+
+# Where the sprites are at the end of a step
+def positions():
+	return {'b': (b_x, b_y), 'p1': (p1_x, p1_y), 'p2': (p2_x, p2_y), 'gk1': (gk1_x, gk1_y), 'gk2': (gk2_x, gk2_y)}
+
+# Also called after teleporting the sprites, so they are not drawn sliding
+def remember():
+	global last_pos
+	last_pos = positions()
+
+# Sprite rects a fraction alpha of the way from the last step to this one
+def sprite_rects(alpha):
+	rects = {}
+	for name, (x, y) in positions().items():
+		last_x, last_y = last_pos.get(name, (x, y))
+		rects[name] = sprites[name].get_rect(center=(last_x + (x - last_x) * alpha, last_y + (y - last_y) * alpha))
+	return rects
+
+def track_keys(event):
+	global move_x, move_y, kick, hit
+	if event.type == pygame.KEYDOWN :
+		if event.key == pygame.K_i :
+			move_y = -3
+		if event.key == pygame.K_k :
+			move_y = 3
+		if event.key == pygame.K_j :
+			move_x = -3
+		if event.key == pygame.K_l :
+			move_x = 3
+		if event.key == pygame.K_q :
+			kick = 1
+			hit = 1
+	if event.type == pygame.KEYUP :
+		if event.key in (pygame.K_i, pygame.K_k) :
+			move_y = 0
+		if event.key in (pygame.K_j, pygame.K_l) :
+			move_x = 0
+		if event.key == pygame.K_q :
+			kick = 0
+			hit = 0
+
 def move_p2(b_x, b_y, p2_x, p2_y, p1_x, p1_y):
 	global control, arg, g1_x, g1_y, connect
 	if arg == 0:
@@ -111,20 +328,14 @@ def move_p2(b_x, b_y, p2_x, p2_y, p1_x, p1_y):
 		return p2_x, p2_y,b_x,b_y
 	return p2_x,p2_y,b_x,b_y
 
-def goal(score,x,y,t):
-	global arg
-	global control, collected_gk1, collected_gk2, move_x, move_y, b_rect, p1_rect, p2_rect
-	global img_1, kick, p1_x, p1_y, b_x, b_y, p2_x, p2_y, dim_x1, dim_x2, dim_y1, dim_y2, g2_x, g2_y
-	arg = 0
-	pygame.mixer.music.load('sounds/whistle.wav')
-	pygame.mixer.music.play(1)
-	score = 0
-	x = str(x)
-	y = str(y)
-	scored = pygame.image.load('images/3.png')
-	font = pygame.font.Font('freesansbold.ttf', 32)
-	text = font.render('RED : BLUE', True, red)
-	board = font.render(y+' : '+x, True, red)
+def goal():
+	global view
+	play_music('whistle', 1)
+	x = str(you_g)
+	y = str(cpu_g)
+	scored = images['scored']
+	text = render_text(FONT, 32, 'RED : BLUE', red)
+	board = render_text(FONT, 32, y+' : '+x, red)
 	textRect = text.get_rect()
 	board_rect = board.get_rect()
 	textRect.center = 500, 437
@@ -136,8 +347,15 @@ def goal(score,x,y,t):
 	screen.blit(scored,scored_rect)
 	screen.blit(text,textRect)
 	screen.blit(board, board_rect)
+	view = None
 	pygame.display.update()
-	time.sleep(3)
+	goto(kickoff, 3)
+
+# Players and ball back to the centre spot; the match clock and score carry on
+def kickoff():
+	global arg, img_1, kick, p1_x, p1_y, b_x, b_y, p2_x, p2_y, dim_x1, dim_x2, dim_y1, dim_y2, g2_x, g2_y
+	global move_x, move_y, b_rect, p1_rect, p2_rect, view
+	arg = 0
 	img_1 = 0
 	kick = 0
 	p1_x = 417
@@ -159,7 +377,19 @@ def goal(score,x,y,t):
 	b_rect.center = b_x,b_y
 	p1_rect.center = p1_x,p1_y
 	p2_rect.center = p2_x,p2_y
-	football(score,t)
+	screen.fill((0, 0, 0))
+	play_music('crowd', -1)
+	remember()
+	render_reset()
+	view = draw_match
+	goto(football)
+
+def new_match():
+	global match_time, score, you_g, cpu_g
+	match_time = 0
+	score = 0
+	you_g = cpu_g = 0
+	goto(kickoff)
 
 def move_p1(b_x, b_y, p1_x, p1_y, hit):
 	global g1_x, g1_y
@@ -209,12 +439,12 @@ def move_p2_penalty(b_x, b_y, p2_x, p2_y):
 		return b_x, b_y, p2_x, p2_y
 
 def penaltygoal(x, y) :
+	global view
 	k1 = str(x)
 	k2 = str(y)
-	scored = pygame.image.load('images/3.png')
-	font = pygame.font.Font('freesansbold.ttf', 32)
-	text = font.render('RED : BLUE', True, red)
-	board = font.render(k1+' : '+k2, True, red)
+	scored = images['scored']
+	text = render_text(FONT, 32, 'RED : BLUE', red)
+	board = render_text(FONT, 32, k1+' : '+k2, red)
 	textRect = text.get_rect()
 	board_rect = board.get_rect()
 	textRect.center = 500, 437
@@ -226,25 +456,22 @@ def penaltygoal(x, y) :
 	screen.blit(scored,scored_rect)
 	screen.blit(text,textRect)
 	screen.blit(board, board_rect)
+	view = None
 	pygame.display.update()
-	time.sleep(3)
 
 def gameover1(x,y):
-	global pk
-	pygame.mixer.music.load('sounds/whistle.wav')
-	pygame.mixer.music.play(1)
-	game = pygame.font.Font('freesansbold.ttf', 60)
+	global pk, view
+	play_music('whistle', 1)
 	if y < x :
-		go = game.render('TEAM RED HAS WON', True, white)
+		go = render_text(FONT, 60, 'TEAM RED HAS WON', white)
 	elif y > x :
-		go = game.render('TEAM BLUE HAS WON', True, white)
+		go = render_text(FONT, 60, 'TEAM BLUE HAS WON', white)
 	elif y == x:
-		go = game.render('Match Tied', True, white)
+		go = render_text(FONT, 60, 'Match Tied', white)
 	k1 = str(x)
 	k2 = str(y)
-	font = pygame.font.Font('freesansbold.ttf', 32)
-	text = font.render('RED : BLUE', True, white)
-	board = font.render(k1+' : '+k2, True, white)
+	text = render_text(FONT, 32, 'RED : BLUE', white)
+	board = render_text(FONT, 32, k1+' : '+k2, white)
 	textRect = text.get_rect()
 	board_rect = board.get_rect()
 	go_rect = go.get_rect()
@@ -256,31 +483,27 @@ def gameover1(x,y):
 	board_rect.center = 500, 413
 	screen.blit(text,textRect)
 	screen.blit(board, board_rect)
+	view = None
 	pygame.display.update()
-	time.sleep(3)
-	pygame.quit()
-	quit()
+	goto(end, 3)
 	
 def gameover(x,y):
-	global pk
-	pygame.mixer.music.load('sounds/whistle.wav')
-	pygame.mixer.music.play(1)
-	game = pygame.font.Font('freesansbold.ttf', 60)
+	global pk, view
+	play_music('whistle', 1)
 	if y < x :
-		go = game.render('TEAM BLUE HAS WON', True, white)
+		go = render_text(FONT, 60, 'TEAM BLUE HAS WON', white)
 	elif y > x :
-		go = game.render('TEAM RED HAS WON', True, white)
+		go = render_text(FONT, 60, 'TEAM RED HAS WON', white)
 	elif y == x:
 		if pk == 1 :
-			time.sleep(3)
-			penaltyshoot()
+			goto(penaltyshoot, 3)
+			return
 		else :
-			go = game.render('Match Tied', True, white)
+			go = render_text(FONT, 60, 'Match Tied', white)
 	k1 = str(x)
 	k2 = str(y)
-	font = pygame.font.Font('freesansbold.ttf', 32)
-	text = font.render('RED : BLUE', True, white)
-	board = font.render(k2+' : '+k1, True, white)
+	text = render_text(FONT, 32, 'RED : BLUE', white)
+	board = render_text(FONT, 32, k2+' : '+k1, white)
 	textRect = text.get_rect()
 	board_rect = board.get_rect()
 	go_rect = go.get_rect()
@@ -292,19 +515,21 @@ def gameover(x,y):
 	board_rect.center = 500, 413
 	screen.blit(text,textRect)
 	screen.blit(board, board_rect)
+	view = None
 	pygame.display.update()
-	time.sleep(5)
-	pygame.quit()
-	quit()
+	goto(end, 5)
 	
 	
-def scoreboard(t, x, y, p1_rect, p2_rect, b_rect):
-	global gk1, gk1_x, gk1_y, gk2, gk2_x, gk2_y, gk1_rect, gk2_rect
-	x1 = x
-	y1 = y
+# The match clock runs CLOCK_SPEED times faster than real time, so the 90
+# minutes take 108 seconds
+CLOCK_SPEED = 50
+FULL_TIME = 90 * 60
+
+# Score and clock items for render_frame(); seconds is match clock time
+def scoreboard(seconds, x, y):
 	x = str(x)
 	y = str(y)
-	w = int(t * 5 / 3)
+	w = int(seconds)
 	v = w % 60
 	v = int(v)
 	w = w // 60
@@ -315,30 +540,22 @@ def scoreboard(t, x, y, p1_rect, p2_rect, b_rect):
 		k3 = '0'+k3
 	if w < 10:
 		k4 = '0'+k4
-	font = pygame.font.Font('freesansbold.ttf', 20)
-	text = font.render('RED : BLUE', True, white, red)
-	board = font.render(y+' : '+x, True, white, red)
+	text = render_text(FONT, 20, 'RED : BLUE', white, red)
+	board = render_text(FONT, 20, y+' : '+x, white, red)
 	textRect = text.get_rect()
 	board_rect = board.get_rect()
-	font1 = pygame.font.Font('freesansbold.ttf', 30)
-	timer = font1.render(k4+' : '+k3, True, white)
+	timer = render_text(FONT, 30, k4+' : '+k3, white)
 	timer_rect = timer.get_rect()
 	timer_rect.center = 500, 655
 	textRect.center = 102, 635
 	board_rect.center = 102, 655
-	screen.fill((0, 0, 0))
-	screen.blit(bg, (0,0))
-	screen.blit(b, b_rect)
-	screen.blit(p1, p1_rect)
-	screen.blit(p2, p2_rect)
-	screen.blit(text,textRect)
-	screen.blit(timer, timer_rect)
-	screen.blit(board, board_rect)
-	screen.blit(gk1, gk1_rect)
-	screen.blit(gk2, gk2_rect)
-	pygame.display.update()
-	if w == 90 :
-		gameover(x1, y1)
+	return [('text', text, textRect), ('timer', timer, timer_rect), ('board', board, board_rect)]
+
+def draw_match(alpha):
+	rects = sprite_rects(alpha)
+	render_frame([('b', b, rects['b']), ('p1', p1, rects['p1']), ('p2', p2, rects['p2'])]
+	             + scoreboard(match_time * CLOCK_SPEED, you_g, cpu_g)
+	             + [('gk1', gk1, rects['gk1']), ('gk2', gk2, rects['gk2'])])
 
 def move_gk1(gk1_x, gk1_y, p2_x, p2_y, b_x, b_y):
 	global collected_gk1, connect, prev, new, arg, control
@@ -412,7 +629,6 @@ def move_gk2(gk2_x, gk2_y, p1_x, p1_y, b_x, b_y):
 	return gk2_x, gk2_y, b_x, b_y
 	
 def gamereload1(b_x, b_y, p1_x, p1_y, p2_x, p2_y, p1_rect, p2_rect, b_rect):
-	time.sleep(0.5)
 	global gk1_y, gk2_y
 	d1 = math.hypot(b_x - p1_x, b_y - p1_y)
 	p_x = p1_x - b_x
@@ -423,7 +639,6 @@ def gamereload1(b_x, b_y, p1_x, p1_y, p2_x, p2_y, p1_rect, p2_rect, b_rect):
 	return b_x, b_y, p1_x, p1_y, p2_x, p2_y
 
 def gamereload2(b_x, b_y, p1_x, p1_y, p2_x, p2_y):
-	time.sleep(0.5)
 	global gk2_x, gk2_y
 	d1 = math.hypot(b_x - p2_x, b_y - p2_y)
 	p_x = p2_x - b_x
@@ -433,380 +648,214 @@ def gamereload2(b_x, b_y, p1_x, p1_y, p2_x, p2_y):
 	b_y = b_y + p_y * 120
 	return b_x, b_y, p1_x, p1_y, p2_x, p2_y
 	
+# Penalty shootout: three rounds, each a red kick (Q shoots) at the blue
+# keeper and then a blue kick at the red keeper.
 def penaltyshoot() :
-	pygame.mixer.music.load('sounds/crowd.wav')
-	pygame.mixer.music.play(-1)
-	global you_g, cpu_g, gk1, gk1_x, gk1_y, gk2, gk2_x, gk2_y, gk1_rect, gk2_rect, pk
-	global control, collected_gk1, collected_gk2, move_x, move_y, b_rect, p1_rect, p2_rect
-	global img_1, kick, p1_x, p1_y, b_x, b_y, p2_x, p2_y, dim_x1, dim_x2, dim_y1, dim_y2, g2_x, g2_y
-	score = 0
-	x = y = 0
-	count = 3
+	global pk, pk_x, pk_y, pk_count, hit, collected_gk1, collected_gk2, view
+	play_music('crowd', -1)
+	pk_x = pk_y = 0
+	pk_count = 3
 	hit = 0
 	collected_gk1 = 0 
 	collected_gk2 = 0
 	pk = 0
-	disp = pygame.image.load('11.jpg')
-	disp_rect = disp.get_rect()
-	disp_rect.center = 498, 307
-	b_rect.center = b_x,b_y
-	p2_rect.center = p2_x,p2_y
-	p1_rect.center = p1_x,p1_y
-	gk2_rect.center = gk2_x, gk2_y
-	gk1_rect.center = gk1_x, gk1_y
-	screen.blit(bg, (0,0))
-	screen.blit(p1, p1_rect)
-	screen.blit(b, b_rect)
-	screen.blit(p2, p2_rect)
-	screen.blit(disp, disp_rect)
-	screen.blit(gk1, gk1_rect)
-	screen.blit(gk2, gk2_rect)
-	pygame.display.update()
-	time.sleep(2)
-	while count != 0 :
-		running = True
-		gk1_x, gk1_y = 46, 454
-		gk2_x, gk2_y = 42, 307
-		p1_x, p1_y = 181, 344
-		p2_x, p2_y = 495, 304
-		b_x, b_y = 125, 304
-		b_rect.center = b_x,b_y
-		p2_rect.center = p2_x,p2_y
-		p1_rect.center = p1_x,p1_y
-		gk2_rect.center = gk2_x, gk2_y
-		gk1_rect.center = gk1_x, gk1_y
-		screen.blit(bg, (0,0))
-		screen.blit(p1, p1_rect)
-		screen.blit(b, b_rect)
-		screen.blit(p2, p2_rect)
-		screen.blit(gk1, gk1_rect)
-		screen.blit(gk2, gk2_rect)
-		pygame.display.update()
-		time.sleep(2)
-		while running :
-			clock.tick(30)
-			b_rect.center = b_x,b_y
-			p2_rect.center = p2_x,p2_y
-			p1_rect.center = p1_x,p1_y
-			gk2_rect.center = gk2_x, gk2_y
-			gk1_rect.center = gk1_x, gk1_y
-			screen.blit(bg, (0,0))
-			screen.blit(p1, p1_rect)
-			screen.blit(b, b_rect)
-			screen.blit(p2, p2_rect)
-			screen.blit(gk1, gk1_rect)
-			screen.blit(gk2, gk2_rect)
-			pygame.display.update()
-			if collected_gk2 == 1:
-				collected_gk2 = 0
-				time.sleep(1)
-				running = False
-			else :
-				b_x, b_y, p1_x, p1_y, hit = move_p1(b_x, b_y, p1_x, p1_y, hit)
-				gk2_x, gk2_y, b_x, b_y = move_gk2_pen(gk2_x, gk2_y, p2_x, p2_y, b_x, b_y)
-				for event in pygame.event.get() :
-					if event.type == pygame.KEYDOWN :
-						if event.key == pygame.K_q :
-							hit = 1
-					if event.type == pygame.KEYUP :
-						if event.key == pygame.K_q :
-							hit = 0
-				b_rect.center = b_x,b_y
-				p2_rect.center = p2_x,p2_y
-				p1_rect.center = p1_x,p1_y
-				gk2_rect.center = gk2_x, gk2_y
-				gk1_rect.center = gk1_x, gk1_y
-				screen.blit(bg, (0,0))
-				screen.blit(p1, p1_rect)
-				screen.blit(b, b_rect)
-				screen.blit(p2, p2_rect)
-				screen.blit(gk1, gk1_rect)
-				screen.blit(gk2, gk2_rect)
-				pygame.display.update()
-			if (b_x < 27) and  (b_y < 395 and b_y > 229):
-				score = 1
-				x = x + 1
-				penaltygoal(x, y)
-				running = False
-				b_rect.center = b_x,b_y
-				p2_rect.center = p2_x,p2_y
-				p1_rect.center = p1_x,p1_y
-				gk2_rect.center = gk2_x, gk2_y
-				gk1_rect.center = gk1_x, gk1_y
-				screen.blit(bg, (0,0))
-				screen.blit(p1, p1_rect)
-				screen.blit(b, b_rect)
-				screen.blit(p2, p2_rect)
-				screen.blit(gk1, gk1_rect)
-				screen.blit(gk2, gk2_rect)
-				pygame.display.update()
-				time.sleep(1)
-		gk1_x, gk1_y = 42, 307
-		gk2_x, gk2_y = 46, 454
-		p1_x, p1_y = 495, 304
-		p2_x, p2_y = 181, 344
-		b_x, b_y = 125, 304
-		b_rect.center = b_x,b_y
-		p2_rect.center = p2_x,p2_y
-		p1_rect.center = p1_x,p1_y
-		gk2_rect.center = gk2_x, gk2_y
-		gk1_rect.center = gk1_x, gk1_y
-		screen.blit(bg, (0,0))
-		screen.blit(p1, p1_rect)
-		screen.blit(b, b_rect)
-		screen.blit(p2, p2_rect)
-		screen.blit(gk1, gk1_rect)
-		screen.blit(gk2, gk2_rect)
-		pygame.display.update()
-		time.sleep(2)
-		running = True
-		while running :
-			clock.tick(30)
-			b_rect.center = b_x,b_y
-			p2_rect.center = p2_x,p2_y
-			p1_rect.center = p1_x,p1_y
-			gk2_rect.center = gk2_x, gk2_y
-			gk1_rect.center = gk1_x, gk1_y
-			screen.blit(bg, (0,0))
-			screen.blit(p1, p1_rect)
-			screen.blit(b, b_rect)
-			screen.blit(p2, p2_rect)
-			screen.blit(gk1, gk1_rect)
-			screen.blit(gk2, gk2_rect)
-			pygame.display.update()
-			if collected_gk1 == 1:
-				collected_gk1 = 0
-				time.sleep(1)
-				running = False
-			else :
-				b_x, b_y, p2_x, p2_y = move_p2_penalty(b_x, b_y, p2_x, p2_y)
-				gk1_x, gk1_y, b_x, b_y = move_gk1(gk1_x, gk1_y, p2_x, p2_y, b_x, b_y)
-				b_rect.center = b_x,b_y
-				p2_rect.center = p2_x,p2_y
-				p1_rect.center = p1_x,p1_y
-				gk2_rect.center = gk2_x, gk2_y
-				gk1_rect.center = gk1_x, gk1_y
-				screen.blit(bg, (0,0))
-				screen.blit(p1, p1_rect)
-				screen.blit(b, b_rect)
-				screen.blit(p2, p2_rect)
-				screen.blit(gk1, gk1_rect)
-				screen.blit(gk2, gk2_rect)
-				pygame.display.update()
-			if (b_x < 27) and  (b_y < 395 and b_y > 229):
-				score = 1
-				y = y + 1
-				penaltygoal(x, y)
-				running = False
-				b_rect.center = b_x,b_y
-				p2_rect.center = p2_x,p2_y
-				p1_rect.center = p1_x,p1_y
-				gk2_rect.center = gk2_x, gk2_y
-				gk1_rect.center = gk1_x, gk1_y
-				screen.blit(bg, (0,0))
-				screen.blit(p1, p1_rect)
-				screen.blit(b, b_rect)
-				screen.blit(p2, p2_rect)
-				screen.blit(gk1, gk1_rect)
-				screen.blit(gk2, gk2_rect)
-				pygame.display.update()
-				time.sleep(1)
-		count -= 1
-	time.sleep(3)
-	gameover1(x,y)
-
-def football(score = 0,t = 0):
-    screen.fill((0, 0, 0))
-    pygame.mixer.music.load('sounds/crowd.wav')
-    pygame.mixer.music.play(-1)
+	render_reset()
+	view = functools.partial(draw_penalty, banner=True)
+	goto(penalty_setup_shot, 2)
+
+def draw_penalty(alpha, banner=False):
+	rects = sprite_rects(alpha)
+	items = [('p1', p1, rects['p1']), ('b', b, rects['b']), ('p2', p2, rects['p2'])]
+	if banner:
+		disp = images['penalty']
+		disp_rect = disp.get_rect()
+		disp_rect.center = 498, 307
+		items.append(('banner', disp, disp_rect))
+	render_frame(items + [('gk1', gk1, rects['gk1']), ('gk2', gk2, rects['gk2'])])
+
+def penalty_setup_shot():
+	global gk1_x, gk1_y, gk2_x, gk2_y, p1_x, p1_y, p2_x, p2_y, b_x, b_y, view
+	gk1_x, gk1_y = 46, 454
+	gk2_x, gk2_y = 42, 307
+	p1_x, p1_y = 181, 344
+	p2_x, p2_y = 495, 304
+	b_x, b_y = 125, 304
+	remember()
+	view = draw_penalty
+	goto(penalty_shot, 2)
+
+def penalty_shot():
+	global gk2_x, gk2_y, p1_x, p1_y, b_x, b_y, hit, collected_gk2, pk_x
+	if collected_gk2 == 1:
+		collected_gk2 = 0
+		goto(penalty_setup_save, 1)
+		return
+	b_x, b_y, p1_x, p1_y, hit = move_p1(b_x, b_y, p1_x, p1_y, hit)
+	gk2_x, gk2_y, b_x, b_y = move_gk2_pen(gk2_x, gk2_y, p2_x, p2_y, b_x, b_y)
+	if (b_x < 27) and  (b_y < 395 and b_y > 229):
+		pk_x = pk_x + 1
+		penaltygoal(pk_x, pk_y)
+		goto(functools.partial(penalty_replay, penalty_setup_save), 3)
+
+def penalty_setup_save():
+	global gk1_x, gk1_y, gk2_x, gk2_y, p1_x, p1_y, p2_x, p2_y, b_x, b_y, view
+	gk1_x, gk1_y = 42, 307
+	gk2_x, gk2_y = 46, 454
+	p1_x, p1_y = 495, 304
+	p2_x, p2_y = 181, 344
+	b_x, b_y = 125, 304
+	remember()
+	view = draw_penalty
+	goto(penalty_save, 2)
+
+def penalty_save():
+	global gk1_x, gk1_y, p2_x, p2_y, b_x, b_y, collected_gk1, pk_y
+	if collected_gk1 == 1:
+		collected_gk1 = 0
+		goto(penalty_next_round, 1)
+		return
+	b_x, b_y, p2_x, p2_y = move_p2_penalty(b_x, b_y, p2_x, p2_y)
+	gk1_x, gk1_y, b_x, b_y = move_gk1(gk1_x, gk1_y, p2_x, p2_y, b_x, b_y)
+	if (b_x < 27) and  (b_y < 395 and b_y > 229):
+		pk_y = pk_y + 1
+		penaltygoal(pk_x, pk_y)
+		goto(functools.partial(penalty_replay, penalty_next_round), 3)
+
+# Back to the pitch after the goal overlay, for a second
+def penalty_replay(next_scene):
+	global view
+	render_reset()
+	view = draw_penalty
+	goto(next_scene, 1)
+
+def penalty_next_round():
+	global pk_count
+	pk_count -= 1
+	if pk_count == 0:
+		goto(penalty_result, 3)
+	else:
+		goto(penalty_setup_shot)
+
+def penalty_result():
+	gameover1(pk_x, pk_y)
+
+# One simulation step of the match
+def football():
     global you_g, cpu_g, gk1, gk1_x, gk1_y, gk2, gk2_x, gk2_y, gk1_rect, gk2_rect
     global control, collected_gk1, collected_gk2, move_x, move_y, b_rect, p1_rect, p2_rect
     global img_1, kick, p1_x, p1_y, b_x, b_y, p2_x, p2_y, dim_x1, dim_x2, dim_y1, dim_y2, g2_x, g2_y
-    running = True
-    
+    global match_time, score
+    match_time = match_time + STEP
+    if score == 1:
+    	score = 0
+    	goto(goal, 1)
+    	return
+    if match_time * CLOCK_SPEED >= FULL_TIME:
+    	gameover(you_g, cpu_g)
+    	return
+
+    if (p1_y <= dim_y1) and move_y == -3:
+    	move_y = 0
+    if (p1_x <= dim_x1) and move_x == -3:
+    	move_x = 0
+    if (p1_y >= dim_y2) and move_y == 3:
+    	move_y = 0
+    if (p1_x >= dim_x2) and move_x == 3:
+    	move_x = 0
+    	        	
+    p1_x,p1_y = p1_x + move_x, p1_y + move_y
+    d1 = math.hypot(p1_x - b_x, p1_y - b_y)
+    d4 = math.hypot(p2_x - p1_x, p2_y - p1_y)
+
+    if d1 < 26 and kick != 1 :
+    	if move_x == -3:
+    		b_x,b_y = b_x - 5, b_y
+    		control = 1
+    	if move_y == -3:
+    		b_x,b_y = b_x + 10, b_y - 20
+    		control = 1
+    	if move_x == 3 and b_y < 310 and d4 <= 30:
+    		b_x,b_y = b_x + 20, b_y + 10
+    		control = 1
+    	elif move_x == 3 and b_y > 310 and d4 <= 30:
+    		b_x,b_y = b_x + 20, b_y - 10
+    		control = 1
+    	elif move_x == 3:
+    		b_x, b_y = b_x + 20, b_y
+    		control = 1
+    	if move_y == 3:
+    		b_x,b_y = b_x + 10, b_y + 20
+    		control = 1
+    if 	d1 < 45 :	
+    	if kick == 1 and b_y <= 310:
+    		b_x, b_y = b_x + 130, b_y + 100
+    		control = 1
+    	elif kick == 1 and b_y > 310 :
+    		b_x, b_y = b_x + 130, b_y - 100
+    		control = 1
+    		
+    d1 = math.hypot(p1_x - b_x, p1_y - b_y)
+    d2 = math.hypot(p2_x - b_x, p2_y - b_y)
+    if d1 < 26:
+    	control = 1
+    if d2 < 26:
+    	control = 2
+    if p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 1 and d1 < 40 and d2 < 40 and b_y < 310:
+    	b_x, b_y = b_x + 40, b_y + 70
+    elif p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 2 and d1 < 30 and d2 < 30 and b_y < 310:
+    	b_x, b_y = b_x - 40, b_y + 70
+    elif p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 1 and d1 < 40 and d2 < 40 and b_y >= 310:
+    	b_x, b_y = b_x + 40, b_y - 70
+    elif p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 2 and d1 < 30 and d2 < 30 and b_y >= 310:
+    	b_x, b_y = b_x - 40, b_y - 70
+    	
+    p2_x, p2_y,b_x,b_y = move_p2(b_x, b_y, p2_x, p2_y, p1_x, p1_y)
+    gk1_x, gk1_y, b_x, b_y = move_gk1(gk1_x, gk1_y, p2_x, p2_y, b_x, b_y)
+    gk2_x, gk2_y, b_x, b_y= move_gk2(gk2_x, gk2_y, p1_x, p1_y, b_x, b_y)
     
-    while running:
-        clock.tick(30)
-        screen.blit(bg, (0,0))
-        screen.blit(p1, p1_rect)
-        screen.blit(b, b_rect)
-        screen.blit(p2, p2_rect)
-        screen.blit(gk1, gk1_rect)
-        screen.blit(gk2, gk2_rect)
-        t = t + 1
-        if score == 1:
-        	time.sleep(1)
-        	goal(score,you_g,cpu_g,t)
-        scoreboard(t, you_g, cpu_g, p1_rect, p2_rect, b_rect)
-        pygame.display.update()
-        
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT :
-                pygame.quit()
-                quit()
-            if event.type == pygame.KEYDOWN :
-                if event.key == pygame.K_i :
-                    move_y = -3
-            if event.type == pygame.KEYUP :
-                if event.key == pygame.K_i :
-                    move_y = 0
-            if event.type == pygame.KEYDOWN :
-                if event.key == pygame.K_k :	
-                    move_y = 3
-            if event.type == pygame.KEYUP :
-                if event.key == pygame.K_k :	
-                    move_y = 0
-            if event.type == pygame.KEYDOWN :
-                if event.key == pygame.K_j :
-                    move_x = -3
-            if event.type == pygame.KEYUP :
-                if event.key == pygame.K_j :
-                    move_x = 0
-            if event.type == pygame.KEYDOWN :
-                if event.key == pygame.K_l :	
-                    move_x = 3
-            if event.type == pygame.KEYUP :
-                if event.key == pygame.K_l :	
-                    move_x = 0
-            if event.type == pygame.KEYDOWN :
-                if event.key == pygame.K_q :	
-                    kick = 1
-            if event.type == pygame.KEYUP :
-                if event.key == pygame.K_q :	
-                    kick = 0
-                            
-        if (p1_y <= dim_y1) and move_y == -3:
-        	move_y = 0
-        if (p1_x <= dim_x1) and move_x == -3:
-        	move_x = 0
-        if (p1_y >= dim_y2) and move_y == 3:
-        	move_y = 0
-        if (p1_x >= dim_x2) and move_x == 3:
-        	move_x = 0
-        	        	
-        p1_x,p1_y = p1_x + move_x, p1_y + move_y
-        d1 = math.hypot(p1_x - b_x, p1_y - b_y)
-        d4 = math.hypot(p2_x - p1_x, p2_y - p1_y)
-
-        if d1 < 26 and kick != 1 :
-        	if move_x == -3:
-        		b_x,b_y = b_x - 5, b_y
-        		control = 1
-        	if move_y == -3:
-        		b_x,b_y = b_x + 10, b_y - 20
-        		control = 1
-        	if move_x == 3 and b_y < 310 and d4 <= 30:
-        		b_x,b_y = b_x + 20, b_y + 10
-        		control = 1
-        	elif move_x == 3 and b_y > 310 and d4 <= 30:
-        		b_x,b_y = b_x + 20, b_y - 10
-        		control = 1
-        	elif move_x == 3:
-        		b_x, b_y = b_x + 20, b_y
-        		control = 1
-        	if move_y == 3:
-        		b_x,b_y = b_x + 10, b_y + 20
-        		control = 1
-        if 	d1 < 45 :	
-        	if kick == 1 and b_y <= 310:
-        		b_x, b_y = b_x + 130, b_y + 100
-        		control = 1
-        	elif kick == 1 and b_y > 310 :
-        		b_x, b_y = b_x + 130, b_y - 100
-        		control = 1
-        		
-        d1 = math.hypot(p1_x - b_x, p1_y - b_y)
-        d2 = math.hypot(p2_x - b_x, p2_y - b_y)
-        if d1 < 26:
-        	control = 1
-        if d2 < 26:
-        	control = 2
-        if p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 1 and d1 < 40 and d2 < 40 and b_y < 310:
-        	b_x, b_y = b_x + 40, b_y + 70
-        elif p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 2 and d1 < 30 and d2 < 30 and b_y < 310:
-        	b_x, b_y = b_x - 40, b_y + 70
-        elif p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 1 and d1 < 40 and d2 < 40 and b_y >= 310:
-        	b_x, b_y = b_x + 40, b_y - 70
-        elif p2_x - p1_x < 100 and (p1_y - p2_y) < 20 and control == 2 and d1 < 30 and d2 < 30 and b_y >= 310:
-        	b_x, b_y = b_x - 40, b_y - 70
-        	
-        p2_x, p2_y,b_x,b_y = move_p2(b_x, b_y, p2_x, p2_y, p1_x, p1_y)
-        gk1_x, gk1_y, b_x, b_y = move_gk1(gk1_x, gk1_y, p2_x, p2_y, b_x, b_y)
-        gk2_x, gk2_y, b_x, b_y= move_gk2(gk2_x, gk2_y, p1_x, p1_y, b_x, b_y)
-        
-        if collected_gk1 == 1 :
-        	b_rect.center = b_x,b_y
-        	p2_rect.center = p2_x,p2_y
-        	p1_rect.center = p1_x,p1_y
-        	gk2_rect.center = gk2_x, gk2_y
-        	gk1_rect.center = gk1_x, gk1_y
-        	screen.blit(bg, (0,0))
-        	screen.blit(p1, p1_rect)
-        	screen.blit(b, b_rect)
-        	screen.blit(p2, p2_rect)
-        	screen.blit(gk1, gk1_rect)
-        	screen.blit(gk2, gk2_rect)
-        	if t >= 2700:
-        		gameover(you_g, cpu_g)
-        	if score == 1:
-        		time.sleep(1)
-        		goal(score,you_g,cpu_g,t)
-        	scoreboard(t, you_g, cpu_g, p1_rect, p2_rect, b_rect)
-        	pygame.display.update()
-        	b_x, b_y, p1_x, p1_y, p2_x, p2_y = gamereload1(b_x, b_y, p1_x, p1_y, p2_x, p2_y, p1_rect, p2_rect, b_rect)
-        	collected_gk1 = 0
-        	pygame.mixer.music.load('sounds/crowd.wav')
-        	pygame.mixer.music.play(-1)
-        	
-        elif collected_gk2 == 1 :
-        	b_rect.center = b_x,b_y
-        	p2_rect.center = p2_x,p2_y
-        	p1_rect.center = p1_x,p1_y
-        	gk2_rect.center = gk2_x, gk2_y
-        	gk1_rect.center = gk1_x, gk1_y
-        	screen.blit(bg, (0,0))
-        	screen.blit(p1, p1_rect)
-        	screen.blit(b, b_rect)
-        	screen.blit(p2, p2_rect)
-        	screen.blit(gk1, gk1_rect)
-        	screen.blit(gk2, gk2_rect)
-        	if t >= 2700:
-        		gameover(you_g, cpu_g)
-        	if score == 1:
-        		time.sleep(5)
-        		goal(score,you_g,cpu_g,t)
-        	scoreboard(t, you_g, cpu_g, p1_rect, p2_rect, b_rect)
-        	pygame.display.update()
-        	b_x, b_y, p1_x, p1_y, p2_x, p2_y = gamereload2(b_x, b_y, p1_x, p1_y, p2_x, p2_y)
-        	collected_gk2 = 0
-        	pygame.mixer.music.load('sounds/crowd.wav')
-        	pygame.mixer.music.play(-1)
-        	
-        if(((b_x < 27 ) or (b_x > 975)) and  b_y < 395 and b_y > 229):
-        	score = 1
-        	if b_x < 27:
-        		you_g += 1
-        	if b_x > 975:
-        		cpu_g += 1
-        if (b_y <= dim_y1):
-        	b_y = 12
-        	flag_t = 1
-        if (b_x <= dim_x1):
-        	b_x = 27
-        	flag_t = 1
-        if (b_y >= dim_y2):
-        	b_y = 595
-        	flag_t = 1
-        if (b_x >= dim_x2):
-        	b_x = 966
-        	flag_t = 1
-        	
-        b_rect.center = b_x,b_y
-        p2_rect.center = p2_x,p2_y
-        p1_rect.center = p1_x,p1_y
-        gk2_rect.center = gk2_x, gk2_y
-        gk1_rect.center = gk1_x, gk1_y
+    if collected_gk1 == 1 or collected_gk2 == 1 :
+    	goto(keeper_throw, 0.5)
+    	return
+    	
+    if(((b_x < 27 ) or (b_x > 975)) and  b_y < 395 and b_y > 229):
+    	score = 1
+    	if b_x < 27:
+    		you_g += 1
+    	if b_x > 975:
+    		cpu_g += 1
+    if (b_y <= dim_y1):
+    	b_y = 12
+    	flag_t = 1
+    if (b_x <= dim_x1):
+    	b_x = 27
+    	flag_t = 1
+    if (b_y >= dim_y2):
+    	b_y = 595
+    	flag_t = 1
+    if (b_x >= dim_x2):
+    	b_x = 966
+    	flag_t = 1
+    	
+    b_rect.center = b_x,b_y
+    p2_rect.center = p2_x,p2_y
+    p1_rect.center = p1_x,p1_y
+    gk2_rect.center = gk2_x, gk2_y
+    gk1_rect.center = gk1_x, gk1_y
+
+# The keeper holding the ball throws it out and play resumes
+def keeper_throw():
+	global collected_gk1, collected_gk2, b_x, b_y, p1_x, p1_y, p2_x, p2_y
+	if collected_gk1 == 1 :
+		b_x, b_y, p1_x, p1_y, p2_x, p2_y = gamereload1(b_x, b_y, p1_x, p1_y, p2_x, p2_y, p1_rect, p2_rect, b_rect)
+		collected_gk1 = 0
+	else :
+		b_x, b_y, p1_x, p1_y, p2_x, p2_y = gamereload2(b_x, b_y, p1_x, p1_y, p2_x, p2_y)
+		collected_gk2 = 0
+	play_music('crowd', -1)
+	b_rect.center = b_x,b_y
+	p2_rect.center = p2_x,p2_y
+	p1_rect.center = p1_x,p1_y
+	goto(football)
 
 
 def button(msg,x,y,w,h,ic,ac,action=None):
@@ -816,24 +865,35 @@ def button(msg,x,y,w,h,ic,ac,action=None):
         if click[0] == 1 and action != None:
             if action == penaltyshoot:
             	screen.fill((0, 0, 0))
-            action()
-    smallText = pygame.font.Font("freesansbold.ttf",25)
-    text = smallText.render(msg, True,(255,255,255))
+            goto(action)
+    text = render_text(FONT, 25, msg, white)
     textRect = text.get_rect()
     textRect.center = ( (x+(w/2)), (y+(h/2)) )
     screen.blit(text, textRect)
     
     
 def how_to_play():
-	control = pygame.image.load('images/controls.jpeg')
+	control = images['controls']
 	control_rect = control.get_rect()
 	control_rect.center = 500, 250
 	screen.blit(control, control_rect)
 	pygame.display.update()
-	time.sleep(5)
+	goto(main_menu, 5)
+
+
+def main_menu():
 	screen.fill((0, 0, 0))
 	screen.blit(back, back_rect)
 	pygame.display.update()
+	goto(menu)
+
+
+def menu():
+	button("Play",460,480,100,40,white,white,new_match)
+	button("Controls",460,520,100,40,white,white, how_to_play)
+	# button("Penalty Shoot",460,560,100,40,white, white, penaltyshoot)
+	button("Quit",460,560,100,40,white,white, end)
+	pygame.display.update()
 
 
 def end():
@@ -842,20 +902,20 @@ def end():
 
 
 def start(play):
-	t = 0
-	pygame.mixer.music.load('sounds/ipl.wav')
-	pygame.mixer.music.play(1)
+	play_music('intro', 1)
+	goto(menu)
+	accumulator = 0
 	while play :
-		clock.tick(15)
+		accumulator += min(clock.tick(FPS) / 1000, MAX_FRAME)
 		for event in pygame.event.get():
 			if event.type == pygame.QUIT :
-				pygame.quit()
-				quit()
-		button("Play",460,480,100,40,white,white,football)
-		button("Controls",460,520,100,40,white,white, how_to_play)
-		# button("Penalty Shoot",460,560,100,40,white, white, penaltyshoot)
-		button("Quit",460,560,100,40,white,white, end)
-		pygame.display.update()
+				end()
+			track_keys(event)
+		while accumulator >= STEP:
+			step()
+			accumulator -= STEP
+		if view is not None:
+			view(accumulator / STEP)
 
 
 start(True)
@@ -0,0 +1,148 @@
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import numpy as np
+import npg
+from replay import read_capture
+from simulator import SimulatedDevice
+
+###############################################
+# Benchmark Runs
+###############################################
+
+STAGES = ["decode", "dsp", "classify", "lsl", "end_to_end"]
+
+def summarize(times, samples):
+    times = np.asarray(times)
+    total = times.sum()
+    p50, p99 = np.percentile(times, [50, 99]) * 1e6
+    return {"calls": len(times), "samples": samples,
+            "samples_per_s": round(samples / total) if total else None,
+            "mean_us": round(float(times.mean()) * 1e6, 2),
+            "p50_us": round(float(p50), 2), "p99_us": round(float(p99), 2)}
+
+# Packet format of the benchmarked devices
+DEFAULT_FORMAT = {"channels": npg.CHANNELS, "sample_rate": npg.SAMPLE_RATE, "block": npg.BLOCK_COUNT}
+
+def make_engine(count, fmt, model=None):
+    devices = [{"name": f"bench{i}", "device_name": "", "keys": ["k", "i"],
+                "stream_name": f"NPG-bench{i}", "model": model, **fmt} for i in range(count)]
+    engine = npg.AcquisitionEngine(devices, send_keys=False)
+    engine.keyout.start()
+    return engine
+
+# Interleave notifications round-robin over the devices, as the BLE callback
+# would see them with every armband streaming.
+def schedule(engine, streams):
+    for k in range(min(len(s) for s in streams)):
+        for device, stream in zip(engine.devices, streams):
+            yield device, stream[k]
+
+# Time each stage separately. Mirrors Device.process_block without the
+# discontinuity handling, which a clean stream never needs.
+def run_stages(count, streams, fmt, model=None):
+    engine = make_engine(count, fmt, model)
+    times = {stage: [] for stage in STAGES[:-1]}
+    samples = 0
+    clock = time.perf_counter
+    for device, payload in schedule(engine, streams):
+        t0 = clock()
+        device.notification_handler(None, payload)
+        t1 = clock()
+        counters, channels, timestamps, arrivals = device.buffer.read()
+        unrolled, channels, timestamps, arrivals, synthetic, _ = \
+            device.sequencer.process(counters, channels, timestamps, arrivals)
+        filtered = device.filters.process(npg.normalize_sample(channels))
+        enveloped = device.envelope.process(filtered)
+        active = device.baseline.process(enveloped)
+        t2 = clock()
+        for i, gesture in device.classifier.process(filtered, enveloped, active):
+            device.update_keys(gesture, arrivals[i])
+        t3 = clock()
+        device.push_lsl(enveloped, timestamps, synthetic)
+        t4 = clock()
+        times["decode"].append(t1 - t0)
+        times["dsp"].append(t2 - t1)
+        times["classify"].append(t3 - t2)
+        times["lsl"].append(t4 - t3)
+        samples += len(unrolled)
+    engine.keyout.stop()
+    return {stage: summarize(values, samples) for stage, values in times.items()}
+
+# Time the real callback plus consumer path per notification, on one thread.
+def run_end_to_end(count, streams, fmt, model=None):
+    engine = make_engine(count, fmt, model)
+    times = []
+    clock = time.perf_counter
+    for device, payload in schedule(engine, streams):
+        t0 = clock()
+        device.notification_handler(None, payload)
+        device.process_block(*device.buffer.read())
+        times.append(clock() - t0)
+    engine.keyout.stop()
+    samples = sum(device.samples_total for device in engine.devices)
+    result = summarize(times, samples)
+    # Fraction of one core needed to keep up in real time, and how many
+    # devices that core could serve at this rate
+    rate = fmt["sample_rate"]
+    result["core_load"] = round(count * rate / result["samples_per_s"], 4)
+    result["max_devices_per_core"] = int(result["samples_per_s"] // rate)
+    return result
+
+# fmt overrides DEFAULT_FORMAT for synthetic streams; captures use the format
+# recorded in their metadata.
+def run(device_counts, seconds, capture=None, model=None, repeat=1, fmt=None):
+    fmt = {**DEFAULT_FORMAT, **(fmt or {})}
+    if capture is not None:
+        meta, records = read_capture(capture)
+        fmt.update({key: meta[key] for key in DEFAULT_FORMAT if key in meta})
+        base = [bytes(payload) for _, payload in records]
+    for count in device_counts:
+        if capture is not None:
+            streams = [base] * count
+        else:
+            blocks = int(seconds * fmt["sample_rate"]) // fmt["block"]
+            streams = [SimulatedDevice(rate=fmt["sample_rate"], channels=fmt["channels"], block=fmt["block"],
+                                       seed=i, first_counter=17 * i).packets(blocks) for i in range(count)]
+        for r in range(repeat):
+            source = {"source": capture or "synthetic", "devices": count, "repeat": r, **fmt}
+            for stage, stats in run_stages(count, streams, fmt, model).items():
+                yield {"bench": "stage", "stage": stage, **source, **stats}
+            yield {"bench": "stage", "stage": "end_to_end", **source, **run_end_to_end(count, streams, fmt, model)}
+
+###############################################
+# Command Line
+###############################################
+
+# python bench.py --devices 1 2 4 8 --seconds 60 --output bench_output.txt
+# Writes one JSON object per line: an environment header, then one line per
+# (device count, stage) with throughput and per-notification latency.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the NPG acquisition pipeline")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=60.0, help="synthetic signal length per device")
+    parser.add_argument("--capture", help="replay this capture (see replay.py) instead of synthetic EMG")
+    parser.add_argument("--model", help="classifier model file (see classifier.py)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=npg.CHANNELS)
+    parser.add_argument("--rate", type=int, default=npg.SAMPLE_RATE)
+    parser.add_argument("--block", type=int, default=npg.BLOCK_COUNT)
+    parser.add_argument("--output", help="also append results to this file")
+    args = parser.parse_args()
+
+    out = open(args.output, "a") if args.output else None
+    header = {"bench": "env", "time": time.time(), "python": sys.version.split()[0],
+              "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor()}
+    fmt = {"channels": args.channels, "sample_rate": args.rate, "block": args.block}
+    records = itertools.chain([header], run(args.devices, args.seconds, args.capture, args.model,
+                                            args.repeat, fmt))
+    for record in records:
+        line = json.dumps(record)
+        print(line)
+        if out is not None:
+            out.write(line + "\n")
+    if out is not None:
+        out.close()
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import numpy as np
+from classifier import MODELS, ThresholdModel, extract_features, save_model
+from dsp import FilterChain
+
+###############################################
+# Calibration Protocol
+###############################################
+
+CALIBRATION_DIR = "calibration"
+
+REST_SECONDS = 3
+GESTURE_SECONDS = 5
+REPETITIONS = 3
+
+# Build the list of prompts: for every device and gesture, a rest period
+# followed by the gesture. Each step is (device name or None, label, prompt, seconds).
+def build_protocol(devices):
+    steps = []
+    for rep in range(1, REPETITIONS + 1):
+        for device in devices:
+            for gesture in range(1, len(device.keys) + 1):
+                steps.append((None, 0, "Relax both arms", REST_SECONDS))
+                steps.append((device.name, gesture,
+                              f"{device.name.upper()}: hold gesture {gesture} ({rep}/{REPETITIONS})",
+                              GESTURE_SECONDS))
+    steps.append((None, 0, "Relax both arms", REST_SECONDS))
+    return steps
+
+###############################################
+# Recorder
+###############################################
+
+# One record per sample: arrival timestamp, gesture label, raw ADC values and
+# the band-passed signal the classifier sees.
+def record_dtype(channels):
+    return np.dtype([
+        ("timestamp", "f8"),
+        ("label", "i1"),
+        ("raw", "i2", (channels,)),
+        ("filtered", "f4", (channels,)),
+    ])
+
+RECORD_DTYPE = record_dtype(3)
+
+# Samples per .npy chunk (~20 s at 250 Hz)
+CHUNK_SAMPLES = 5000
+
+# Writes labelled samples of every device into append-only .npy chunks.
+# index.jsonl gets one line per chunk with the device, file name, sample
+# count and timestamp range.
+class Recorder:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.labels = {}     # current label per device name
+        self.pending = {}    # device name -> list of record arrays not yet written
+        self.chunks = {}     # device name -> number of chunks written
+        self.lock = threading.Lock()
+        for name in os.listdir(directory):
+            if name.endswith(".npy"):
+                device = name.rsplit("-", 1)[0]
+                self.chunks[device] = self.chunks.get(device, 0) + 1
+
+    def set_step(self, device_name, label):
+        with self.lock:
+            self.labels = {device_name: label} if device_name else {}
+
+    def record(self, device_name, raw, filtered, timestamps):
+        records = np.empty(len(raw), dtype=record_dtype(raw.shape[1]))
+        records["timestamp"] = timestamps
+        records["raw"] = raw
+        records["filtered"] = filtered
+        with self.lock:
+            records["label"] = self.labels.get(device_name, 0)
+            pending = self.pending.setdefault(device_name, [])
+            pending.append(records)
+            if sum(len(r) for r in pending) >= CHUNK_SAMPLES:
+                self.flush(device_name)
+
+    # Call with the lock held.
+    def flush(self, device_name):
+        pending = self.pending.pop(device_name, [])
+        if not pending:
+            return
+        records = np.concatenate(pending)
+        number = self.chunks.get(device_name, 0)
+        filename = f"{device_name}-{number:05d}.npy"
+        np.save(os.path.join(self.directory, filename), records)
+        self.chunks[device_name] = number + 1
+        entry = {
+            "device": device_name,
+            "file": filename,
+            "samples": len(records),
+            "first": float(records["timestamp"][0]),
+            "last": float(records["timestamp"][-1]),
+        }
+        with open(os.path.join(self.directory, "index.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def close(self):
+        with self.lock:
+            for device_name in list(self.pending):
+                self.flush(device_name)
+
+###############################################
+# Loading and Fitting
+###############################################
+
+def load_recordings(directory, device_name):
+    chunks = []
+    with open(os.path.join(directory, "index.jsonl")) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["device"] == device_name:
+                chunks.append(np.load(os.path.join(directory, entry["file"])))
+    if not chunks:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.concatenate(chunks)
+
+# Cut the recording into windows that lie entirely inside one label.
+def windows(records, window, hop):
+    X, y = [], []
+    filtered = records["filtered"].astype(np.float64)
+    labels = records["label"]
+    for end in range(window, len(records) + 1, hop):
+        segment = labels[end - window:end]
+        if np.all(segment == segment[0]):
+            X.append(extract_features(filtered[end - window:end]))
+            y.append(int(segment[0]))
+    return np.array(X), np.array(y)
+
+def model_path(directory, device_name):
+    return os.path.join(directory, f"{device_name}_model.npz")
+
+# Fit a model for one device from its recordings and save it next to them.
+# "threshold" keeps the original two-channel rule but places its threshold
+# k standard deviations above the rest-level envelope of this user.
+def fit_model(directory, device_name, kind="lda", window=50, hop=10,
+              envelope=None, threshold_k=3.0, fs=250):
+    records = load_recordings(directory, device_name)
+    if len(records) == 0:
+        raise ValueError(f"No recordings for {device_name} in {directory}")
+
+    if kind == "threshold":
+        model = ThresholdModel()
+        channels = records["filtered"].shape[1]
+        chain = FilterChain(envelope or [{"type": "rectify"}, {"type": "ema", "alpha": 0.2}], fs, channels)
+        env = chain.process(records["filtered"].astype(np.float64))[:, model.channels]
+        rest = env[records["label"] == 0]
+        model.threshold = float(np.max(rest.mean(axis=0) + threshold_k * rest.std(axis=0)))
+    else:
+        X, y = windows(records, window, hop)
+        if len(np.unique(y)) < 2:
+            raise ValueError(f"Need rest and at least one gesture to fit {device_name}")
+        model = MODELS[kind].fit(X, y)
+
+    save_model(model_path(directory, device_name), model)
+    return model
@@ -0,0 +1,241 @@
+import time
+import numpy as np
+
+###############################################
+# Feature Extraction
+###############################################
+
+# Amplitude below which a sign change is not counted as a zero crossing
+ZC_THRESHOLD = 0.01
+
+FEATURE_NAMES = ["mav", "rms", "wl", "zc"]
+
+# Time-domain features of one (samples x channels) window of filtered EMG.
+# Returns a vector laid out as [mav per channel, rms per channel, wl per channel, zc per channel].
+def extract_features(window):
+    diff = np.diff(window, axis=0)
+    mav = np.mean(np.abs(window), axis=0)
+    rms = np.sqrt(np.mean(window * window, axis=0))
+    wl = np.sum(np.abs(diff), axis=0)
+    crossings = (window[:-1] * window[1:] < 0) & (np.abs(diff) >= ZC_THRESHOLD)
+    zc = np.sum(crossings, axis=0)
+    return np.concatenate((mav, rms, wl, zc))
+
+###############################################
+# Models
+###############################################
+
+# Class 0 is always "rest" (no key). Classes 1..N are gestures.
+
+# The original rule: whichever of two channels has the larger envelope wins,
+# once either of them is above threshold. Works on the latest envelope row
+# rather than window features.
+#
+# With adaptive=True the fixed threshold is replaced by per-channel activity
+# from dsp.BaselineEstimator, and only active channels compete.
+class ThresholdModel:
+    kind = "threshold"
+    uses_envelope = True
+
+    def __init__(self, threshold=0.2, channels=(0, 2), adaptive=False):
+        self.threshold = threshold
+        self.channels = list(channels)
+        self.adaptive = adaptive
+
+    def predict(self, envelope, active=None):
+        values = envelope[self.channels]
+        if self.adaptive and active is not None:
+            values = np.where(active[self.channels], values, -np.inf)
+            if not np.isfinite(values.max()):
+                return 0
+        elif values.max() <= self.threshold:
+            return 0
+        order = np.argsort(values)[::-1]
+        if values[order[0]] == values[order[1]]:
+            return 0
+        return int(order[0]) + 1
+
+    def save_params(self):
+        return {"threshold": self.threshold, "channels": np.array(self.channels),
+                "adaptive": self.adaptive}
+
+    # Models saved before the adaptive flag was stored load as fixed
+    @classmethod
+    def from_params(cls, params):
+        return cls(float(params["threshold"]), params["channels"].tolist(),
+                   bool(params.get("adaptive", False)))
+
+# Features are standardized with the training mean/std before any model sees them.
+class NearestCentroid:
+    kind = "centroid"
+    uses_envelope = False
+
+    def __init__(self, centroids, mean, std):
+        self.centroids = centroids
+        self.mean = mean
+        self.std = std
+
+    @classmethod
+    def fit(cls, X, y):
+        mean, std = X.mean(axis=0), X.std(axis=0) + 1e-9
+        Z = (X - mean) / std
+        classes = np.arange(int(y.max()) + 1)
+        centroids = np.array([Z[y == c].mean(axis=0) for c in classes])
+        return cls(centroids, mean, std)
+
+    def predict(self, features):
+        z = (features - self.mean) / self.std
+        return int(np.argmin(np.sum((self.centroids - z) ** 2, axis=1)))
+
+    def save_params(self):
+        return {"centroids": self.centroids, "mean": self.mean, "std": self.std}
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(params["centroids"], params["mean"], params["std"])
+
+# Linear scores W @ z + b, argmax over classes. Shared by LDA and logistic regression.
+class LinearModel:
+    uses_envelope = False
+
+    def __init__(self, weights, bias, mean, std):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.std = std
+
+    def predict(self, features):
+        z = (features - self.mean) / self.std
+        return int(np.argmax(self.weights @ z + self.bias))
+
+    def save_params(self):
+        return {"weights": self.weights, "bias": self.bias, "mean": self.mean, "std": self.std}
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(params["weights"], params["bias"], params["mean"], params["std"])
+
+# Linear discriminant analysis with a shared, lightly regularized covariance
+class LDA(LinearModel):
+    kind = "lda"
+
+    @classmethod
+    def fit(cls, X, y, shrinkage=1e-3):
+        mean, std = X.mean(axis=0), X.std(axis=0) + 1e-9
+        Z = (X - mean) / std
+        classes = np.arange(int(y.max()) + 1)
+        means = np.array([Z[y == c].mean(axis=0) for c in classes])
+        centered = Z - means[y]
+        cov = centered.T @ centered / max(len(Z) - len(classes), 1)
+        cov += shrinkage * np.eye(cov.shape[0])
+        inv = np.linalg.inv(cov)
+        priors = np.array([np.mean(y == c) for c in classes])
+        weights = means @ inv
+        bias = -0.5 * np.sum(weights * means, axis=1) + np.log(priors + 1e-12)
+        return cls(weights, bias, mean, std)
+
+# Multinomial logistic regression trained with plain gradient descent
+class LogisticRegression(LinearModel):
+    kind = "logistic"
+
+    @classmethod
+    def fit(cls, X, y, epochs=500, rate=0.5, l2=1e-3):
+        mean, std = X.mean(axis=0), X.std(axis=0) + 1e-9
+        Z = (X - mean) / std
+        n_classes = int(y.max()) + 1
+        onehot = np.eye(n_classes)[y]
+        weights = np.zeros((n_classes, Z.shape[1]))
+        bias = np.zeros(n_classes)
+        for _ in range(epochs):
+            scores = Z @ weights.T + bias
+            scores -= scores.max(axis=1, keepdims=True)
+            probs = np.exp(scores)
+            probs /= probs.sum(axis=1, keepdims=True)
+            error = (probs - onehot) / len(Z)
+            weights -= rate * (error.T @ Z + l2 * weights)
+            bias -= rate * error.sum(axis=0)
+        return cls(weights, bias, mean, std)
+
+MODELS = {
+    "threshold": ThresholdModel,
+    "centroid": NearestCentroid,
+    "lda": LDA,
+    "logistic": LogisticRegression,
+}
+
+def save_model(path, model, classes=None):
+    params = model.save_params()
+    if classes is not None:
+        params["classes"] = np.array(classes)
+    np.savez(path, kind=model.kind, **params)
+
+def load_model(path):
+    with np.load(path) as params:
+        params = dict(params)
+    kind = str(params.pop("kind"))
+    if kind not in MODELS:
+        raise ValueError(f"Unknown model kind in {path}: {kind}")
+    return MODELS[kind].from_params(params)
+
+###############################################
+# Sliding-Window Classifier
+###############################################
+
+# Runs a model every `hop` samples on the last `window` samples of filtered
+# EMG (or on the latest envelope row for envelope models).
+#
+# If an inference takes longer than budget_ms, the next decision point is
+# skipped and the previous class is repeated, so a slow model cannot make the
+# consumer fall behind the stream.
+class Classifier:
+    def __init__(self, model=None, channels=3, window=50, hop=10, budget_ms=2.0):
+        if model is None:
+            model = ThresholdModel()
+        if model.uses_envelope:
+            window, hop = 1, 1
+        self.model = model
+        self.window = window
+        self.hop = hop
+        self.budget = budget_ms / 1000
+        self.history = np.zeros((0, channels))
+        self.since = 0
+        self.skip = False
+        self.current = 0
+        self.overruns = 0
+        self.last_inference = 0.0
+
+    def reset(self):
+        self.history = self.history[:0]
+        self.since = 0
+        self.skip = False
+        self.current = 0
+
+    # Returns (sample index, class) for every decision point in the block
+    # (possibly none). active is the optional per-sample channel activity for
+    # envelope models.
+    def process(self, filtered, enveloped, active=None):
+        data = np.concatenate((self.history, filtered))
+        offset = len(self.history)
+        decisions = []
+        for i in range(len(filtered)):
+            self.since += 1
+            end = offset + i + 1
+            if self.since < self.hop or end < self.window:
+                continue
+            self.since = 0
+            if self.skip:
+                self.skip = False
+                decisions.append((i, self.current))
+                continue
+            start = time.perf_counter()
+            if self.model.uses_envelope:
+                self.current = self.model.predict(enveloped[i], None if active is None else active[i])
+            else:
+                self.current = self.model.predict(extract_features(data[end - self.window:end]))
+            self.last_inference = time.perf_counter() - start
+            if self.last_inference > self.budget:
+                self.overruns += 1
+                self.skip = True
+            decisions.append((i, self.current))
+        self.history = data[max(len(data) - (self.window - 1), 0):]
+        return decisions
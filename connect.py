@@ -1,20 +1,26 @@
-import threading
+import os
 import time
 import tkinter as tk
 from tkinter import ttk, font
 from functools import partial
 
-# Import your modified modules (make sure you've added global key mapping variables)
-import npg1  # should define key_left_npg1 and key_right_npg1
-import npg2  # should define key_left_npg2 and key_right_npg2
+import calibration
+import npg
+import workers
+
+# One acquisition engine drives every device in npg.DEVICES
+engine = None
+
+# Run each device's BLE link and DSP in its own worker process (see workers.py)
+# instead of threads of this process
+ISOLATED_WORKERS = False
 
 # Store the new mapping values in a dictionary
-key_mappings = {
-    "npg1_left": npg1.key_left_npg1,
-    "npg1_right": npg1.key_right_npg1,
-    "npg2_left": npg2.key_left_npg2,
-    "npg2_right": npg2.key_right_npg2,
-}
+# (one entry per gesture class of each device, e.g. "npg1_1")
+key_mappings = {}
+for cfg in npg.DEVICES:
+    for gesture, key in enumerate(cfg["keys"], start=1):
+        key_mappings[f"{cfg['name']}_{gesture}"] = key
 
 # Helper function for key mapping
 def on_mapping_click(mapping_name, button):
@@ -37,13 +43,22 @@ def on_mapping_click(mapping_name, button):
     # Bind the key press event on the root window
     root.bind("<Key>", key_handler)
 
-# Function to update the module-level key mappings and start the BLE threads
+# Function to apply the key mappings and start the BLE engine
 def start_scripts():
-    # Update the key mappings for both modules
-    npg1.key_left_npg1 = key_mappings["npg1_left"]
-    npg1.key_right_npg1 = key_mappings["npg1_right"]
-    npg2.key_left_npg2 = key_mappings["npg2_left"]
-    npg2.key_right_npg2 = key_mappings["npg2_right"]
+    global engine
+    if engine is not None and engine.running:
+        return
+
+    # Build the device list with the current key mappings
+    devices = []
+    for cfg in npg.DEVICES:
+        cfg = dict(cfg)
+        cfg["keys"] = [key_mappings[f"{cfg['name']}_{gesture}"] for gesture in range(1, len(cfg["keys"]) + 1)]
+        # Load this user's calibrated model if there is one
+        model = calibration.model_path(user_directory(), cfg["name"])
+        if os.path.exists(model):
+            cfg["model"] = model
+        devices.append(cfg)
 
     # Disable the mapping buttons and start button
     for btn in all_mapping_buttons:
@@ -55,22 +70,29 @@ def start_scripts():
     status_label.config(text="Scripts running", foreground="#4CAF50")
     status_indicator.config(bg="#4CAF50")
     
-    # Start the BLE threads from both scripts in separate daemon threads
-    global thread1, thread2, running
-    running = True
-    thread1 = threading.Thread(target=npg1.ble_thread, daemon=True)
-    thread2 = threading.Thread(target=npg2.ble_thread, daemon=True)
-    thread1.start()
-    thread2.start()
+    # Start a single engine thread that runs all devices from one event loop.
+    # A new engine is built each time so changed key mappings and models apply.
+    close_engine()
+    engine = workers.IsolatedEngine(devices) if ISOLATED_WORKERS else npg.AcquisitionEngine(devices)
+    engine.start()
+
+# Stop the engine: devices get STOP, notifications are unsubscribed, held
+# keys are released and the engine's threads (and workers) are joined.
+def close_engine():
+    if engine is None:
+        return
+    stop_recording()
+    if isinstance(engine, workers.IsolatedEngine):
+        engine.close()
+    else:
+        engine.stop()
 
 # Function to stop running scripts
 def stop_scripts():
-    global running
-    running = False
-    
-    # This assumes your ble_thread functions can be stopped by setting a flag
-    # You might need to modify your original modules to support this
-    
+    status_label.config(text="Stopping...", foreground="#F44336")
+    root.update_idletasks()
+    close_engine()
+
     # Re-enable the mapping buttons and start button
     for btn in all_mapping_buttons:
         btn.config(state=tk.NORMAL)
@@ -81,6 +103,118 @@ def stop_scripts():
     status_label.config(text="Scripts stopped", foreground="#F44336")
     status_indicator.config(bg="#F44336")
 
+###############################################
+# Calibration
+###############################################
+
+# Model kind fitted from calibration recordings (see classifier.MODELS)
+CALIBRATION_MODEL = "lda"
+
+recorder = None
+calibration_steps = []
+calibration_job = None  # root.after() id of the next calibration step
+
+def user_directory():
+    user = user_var.get().strip() or "default"
+    return os.path.join(calibration.CALIBRATION_DIR, user)
+
+# Record labelled samples from every device while prompting through the
+# calibration protocol, then fit and load a model per device.
+def start_calibration():
+    global recorder, calibration_steps
+    if engine is None or not engine.running:
+        start_scripts()
+    recorder = calibration.Recorder(user_directory())
+    for device in engine.devices:
+        device.recorder = recorder
+    calibration_steps = calibration.build_protocol(engine.devices)
+    calibrate_button.config(state=tk.DISABLED)
+    run_calibration_step(0)
+
+def run_calibration_step(index):
+    global calibration_job
+    calibration_job = None
+    if recorder is None:
+        return  # cancelled by Stop
+    if index == len(calibration_steps):
+        finish_calibration()
+        return
+    device_name, label, prompt, seconds = calibration_steps[index]
+    recorder.set_step(device_name, label)
+    status_label.config(text=f"{prompt} ({seconds} s)", foreground="#2196F3")
+    calibration_job = root.after(int(seconds * 1000), run_calibration_step, index + 1)
+
+# Detach and close the recorder and cancel the pending step, so a new
+# calibration is not advanced by the old one; returns False if no
+# calibration was running
+def stop_recording():
+    global recorder, calibration_job
+    if calibration_job is not None:
+        root.after_cancel(calibration_job)
+        calibration_job = None
+    if recorder is None:
+        return False
+    for device in engine.devices:
+        device.recorder = None
+    recorder.close()
+    recorder = None
+    calibrate_button.config(state=tk.NORMAL)
+    return True
+
+# Fit from the directory the recordings went to, even if the User field
+# was edited meanwhile
+def finish_calibration():
+    directory = recorder.directory
+    stop_recording()
+    fitted = []
+    for device in engine.devices:
+        try:
+            device.set_model(calibration.fit_model(directory, device.name, kind=CALIBRATION_MODEL,
+                                                   window=device.classifier_window, hop=device.classifier_hop,
+                                                   fs=device.sample_rate))
+            fitted.append(device.name)
+        except ValueError as e:
+            print("Calibration failed:", e)
+    status_label.config(text=f"Calibrated: {', '.join(fitted) or 'none'}", foreground="#4CAF50")
+
+# Refresh the adaptive threshold display twice a second
+def update_thresholds():
+    if engine is not None:
+        for device in engine.devices:
+            baseline = device.baseline
+            if baseline.ready:
+                levels = "  ".join(f"{on:.3f}/{off:.3f}" for on, off in zip(baseline.on, baseline.off))
+                threshold_labels[device.name].config(text=f"Thresholds (on/off): {levels}")
+            else:
+                threshold_labels[device.name].config(text="Thresholds: measuring rest level...")
+    root.after(500, update_thresholds)
+
+# Show per-device stream metrics and arrival-to-keypress latency once a second
+def update_latency():
+    if engine is not None:
+        lines = []
+        snapshot = engine.latency.snapshot()
+        for device in engine.devices:
+            rate = engine.metrics.get("npg_samples_per_second", 0, device=device.name)
+            missing = engine.metrics.get("npg_missing_samples_total", 0, device=device.name)
+            line = f"{device.name}: {rate:.0f} samples/s, {missing} missing"
+            stats = snapshot.get(device.name, {}).get("press")
+            if stats:
+                line += (f", latency p50 {stats['p50']:.1f} / p95 {stats['p95']:.1f} / "
+                         f"p99 {stats['p99']:.1f} ms")
+            lines.append(line)
+        latency_label.config(text="\n".join(lines))
+    root.after(1000, update_latency)
+
+# Write the current latency histograms next to connect.py
+def save_latency():
+    if engine is None:
+        return
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    engine.latency.dump_json(f"latency-{stamp}.json")
+    engine.latency.dump_csv(f"latency-{stamp}.csv")
+    status_label.config(text=f"Saved latency-{stamp}.json/.csv")
+
 # Toggle always on top
 def toggle_always_on_top():
     current_state = root.attributes('-topmost')
@@ -155,7 +289,7 @@ main_frame.grid(row=0, column=0, sticky=(tk.N, tk.W, tk.E, tk.S))
 
 # Header
 header_frame = ttk.Frame(main_frame, style="TFrame")
-header_frame.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 15))
+header_frame.grid(row=0, column=0, columnspan=len(npg.DEVICES), sticky=tk.W, pady=(0, 15))
 
 app_title = ttk.Label(header_frame, text="BLE Key Mapper", style="Header.TLabel")
 app_title.grid(row=0, column=0, sticky=tk.W)
@@ -163,46 +297,34 @@ app_title.grid(row=0, column=0, sticky=tk.W)
 pin_button = ttk.Button(header_frame, text="📌 Pin Window", command=toggle_always_on_top, style="Pin.TButton")
 pin_button.grid(row=0, column=1, sticky=tk.E, padx=(50, 0))
 
-# NPG1 Section
-npg1_frame = ttk.Frame(main_frame, padding="10", style="Section.TFrame")
-npg1_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 5), pady=(0, 10))
-
-npg1_title = ttk.Label(npg1_frame, text="NPG1 Device", font=('Segoe UI', 11, 'bold'), style="Section.TLabel")
-npg1_title.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
-
-ttk.Label(npg1_frame, text="Gesture 1:", style="Section.TLabel").grid(row=1, column=0, sticky=tk.W, pady=5)
-btn_npg1_left = ttk.Button(npg1_frame, text=key_mappings["npg1_left"], width=10)
-btn_npg1_left.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
-btn_npg1_left.config(command=partial(on_mapping_click, "npg1_left", btn_npg1_left))
-
-ttk.Label(npg1_frame, text="Gesture 2:", style="Section.TLabel").grid(row=2, column=0, sticky=tk.W, pady=5)
-btn_npg1_right = ttk.Button(npg1_frame, text=key_mappings["npg1_right"], width=10)
-btn_npg1_right.grid(row=2, column=1, sticky=tk.W, padx=5, pady=5)
-btn_npg1_right.config(command=partial(on_mapping_click, "npg1_right", btn_npg1_right))
-
-# NPG2 Section
-npg2_frame = ttk.Frame(main_frame, padding="10", style="Section.TFrame")
-npg2_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(5, 0), pady=(0, 10))
-
-npg2_title = ttk.Label(npg2_frame, text="NPG2 Device", font=('Segoe UI', 11, 'bold'), style="Section.TLabel")
-npg2_title.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
-
-ttk.Label(npg2_frame, text="Gesture 2:", style="Section.TLabel").grid(row=1, column=0, sticky=tk.W, pady=5)
-btn_npg2_left = ttk.Button(npg2_frame, text=key_mappings["npg2_left"], width=10)
-btn_npg2_left.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
-btn_npg2_left.config(command=partial(on_mapping_click, "npg2_left", btn_npg2_left))
-
-ttk.Label(npg2_frame, text="Gesture 2:", style="Section.TLabel").grid(row=2, column=0, sticky=tk.W, pady=5)
-btn_npg2_right = ttk.Button(npg2_frame, text=key_mappings["npg2_right"], width=10)
-btn_npg2_right.grid(row=2, column=1, sticky=tk.W, padx=5, pady=5)
-btn_npg2_right.config(command=partial(on_mapping_click, "npg2_right", btn_npg2_right))
-
-# Store all mapping buttons for easy access
-all_mapping_buttons = [btn_npg1_left, btn_npg1_right, btn_npg2_left, btn_npg2_right]
+# One section per device in npg.DEVICES
+all_mapping_buttons = []
+threshold_labels = {}
+for index, cfg in enumerate(npg.DEVICES):
+    name = cfg["name"]
+    device_frame = ttk.Frame(main_frame, padding="10", style="Section.TFrame")
+    device_frame.grid(row=1, column=index, sticky=(tk.W, tk.E, tk.N, tk.S),
+                      padx=(0 if index == 0 else 5, 5), pady=(0, 10))
+
+    device_title = ttk.Label(device_frame, text=f"{name.upper()} Device", font=('Segoe UI', 11, 'bold'), style="Section.TLabel")
+    device_title.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
+
+    for row in range(1, len(cfg["keys"]) + 1):
+        mapping_name = f"{name}_{row}"
+        ttk.Label(device_frame, text=f"Gesture {row}:", style="Section.TLabel").grid(row=row, column=0, sticky=tk.W, pady=5)
+        btn = ttk.Button(device_frame, text=key_mappings[mapping_name], width=10)
+        btn.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        btn.config(command=partial(on_mapping_click, mapping_name, btn))
+        all_mapping_buttons.append(btn)
+
+    # Live adaptive trigger levels (on/off per channel)
+    threshold_labels[name] = ttk.Label(device_frame, text="Thresholds: -", style="Section.TLabel",
+                                       font=('Segoe UI', 8))
+    threshold_labels[name].grid(row=len(cfg["keys"]) + 1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
 
 # Control buttons frame
 control_frame = ttk.Frame(main_frame, style="TFrame")
-control_frame.grid(row=2, column=0, columnspan=2, pady=(10, 5))
+control_frame.grid(row=2, column=0, columnspan=len(npg.DEVICES), pady=(10, 5))
 
 # Start and Stop buttons
 start_button = ttk.Button(control_frame, text="▶ Start", command=start_scripts, style="Start.TButton", width=12)
@@ -212,9 +334,18 @@ stop_button = ttk.Button(control_frame, text="◼ Stop", command=stop_scripts, s
 stop_button.grid(row=0, column=1, padx=5)
 stop_button.config(state=tk.DISABLED)
 
+# User name (selects the calibration directory) and Calibrate button
+user_var = tk.StringVar(value="default")
+ttk.Label(control_frame, text="User:").grid(row=1, column=0, sticky=tk.E, padx=5, pady=(10, 0))
+user_entry = ttk.Entry(control_frame, textvariable=user_var, width=14)
+user_entry.grid(row=1, column=1, sticky=tk.W, padx=5, pady=(10, 0))
+
+calibrate_button = ttk.Button(control_frame, text="Calibrate", command=start_calibration, width=12)
+calibrate_button.grid(row=2, column=0, columnspan=2, pady=(5, 0))
+
 # Status frame
 status_frame = ttk.Frame(main_frame, style="TFrame")
-status_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+status_frame.grid(row=3, column=0, columnspan=len(npg.DEVICES), sticky=(tk.W, tk.E), pady=5)
 
 status_indicator = tk.Canvas(status_frame, width=12, height=12, bg="#F44336", highlightthickness=0)
 status_indicator.grid(row=0, column=0, padx=(0, 5))
@@ -222,10 +353,18 @@ status_indicator.grid(row=0, column=0, padx=(0, 5))
 status_label = ttk.Label(status_frame, text="Ready", style="Status.TLabel")
 status_label.grid(row=0, column=1, sticky=tk.W)
 
-# Global variables for thread management
-thread1 = None
-thread2 = None
-running = False
+latency_label = ttk.Label(status_frame, text="Latency: -", style="Status.TLabel")
+latency_label.grid(row=1, column=1, sticky=tk.W)
+
+latency_button = ttk.Button(status_frame, text="Save latency", command=save_latency, style="Pin.TButton")
+latency_button.grid(row=1, column=2, sticky=tk.E, padx=(10, 0))
+
+# Stop the engine before the window goes away
+def on_close():
+    close_engine()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", on_close)
 
 # Center the window on screen
 root.update_idletasks()
@@ -238,6 +377,9 @@ root.geometry(f'{width}x{height}+{x}+{y}')
 # Start with always on top enabled
 root.attributes('-topmost', True)
 
+update_thresholds()
+update_latency()
+
 root.mainloop()
 
 # Clean exit - likely never reached due to daemon threads
\ No newline at end of file
@@ -0,0 +1,227 @@
+import numpy as np
+from scipy import signal
+
+###############################################
+# Streaming Filter Stages
+###############################################
+
+# Every stage takes a (samples x channels) float block and returns a block of
+# the same shape. Filter state is kept between calls, so a signal split into
+# BLE notifications is filtered exactly as if it were processed in one piece.
+
+# IIR band-pass (Butterworth, second-order sections)
+class BandPass:
+    def __init__(self, fs, channels, low=20.0, high=120.0, order=4):
+        self.sos = signal.butter(order, [low, high], btype="bandpass", fs=fs, output="sos")
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((self.sos.shape[0], 2, self.channels))
+
+    def process(self, block):
+        out, self.zi = signal.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return out
+
+# Mains hum notch (50 Hz or 60 Hz)
+class Notch:
+    def __init__(self, fs, channels, freq=50.0, q=30.0):
+        b, a = signal.iirnotch(freq, q, fs=fs)
+        self.sos = signal.tf2sos(b, a)
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((self.sos.shape[0], 2, self.channels))
+
+    def process(self, block):
+        out, self.zi = signal.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return out
+
+# Full-wave rectification
+class Rectify:
+    def __init__(self, fs, channels):
+        pass
+
+    def reset(self):
+        pass
+
+    def process(self, block):
+        return np.abs(block)
+
+# Exponential moving average envelope: y[n] = alpha * x[n] + (1 - alpha) * y[n-1]
+class EMAEnvelope:
+    def __init__(self, fs, channels, alpha=0.2):
+        self.b = np.array([alpha])
+        self.a = np.array([1.0, alpha - 1.0])
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((1, self.channels))
+
+    def process(self, block):
+        out, self.zi = signal.lfilter(self.b, self.a, block, axis=0, zi=self.zi)
+        return out
+
+# Moving RMS envelope over the last `window` samples
+class RMSEnvelope:
+    def __init__(self, fs, channels, window=25):
+        self.window = window
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        # Squared samples of the previous window, prepended to the next block
+        self.history = np.zeros((self.window - 1, self.channels))
+
+    def process(self, block):
+        squared = np.concatenate((self.history, block * block))
+        total = np.cumsum(squared, axis=0)
+        total = np.concatenate((np.zeros((1, self.channels)), total))
+        means = (total[self.window:] - total[:-self.window]) / self.window
+        self.history = squared[len(squared) - (self.window - 1):]
+        return np.sqrt(np.maximum(means, 0.0))
+
+###############################################
+# Adaptive Rest Baseline
+###############################################
+
+# Rest mean and variance of each column of x when part of it may be
+# gesture. Bursts only raise the envelope, so the first guess comes from the
+# low quantiles (the 5% to 25% gap of a normal distribution is 0.971 std),
+# which stay at rest while up to about three quarters of the samples are
+# gesture. Samples more than `clip` std above the guess are then dropped and
+# the statistics recomputed from the rest, a few times over.
+def rest_statistics(x, clip, min_std, iterations=3):
+    q5, q25 = np.percentile(x, [5, 25], axis=0)
+    std = np.maximum((q25 - q5) / 0.971, min_std)
+    mean = q25 + 0.674 * std
+    for _ in range(iterations):
+        keep = x <= mean + clip * std
+        m = np.maximum(keep.sum(axis=0), 1)
+        mean = np.where(keep, x, 0.0).sum(axis=0) / m
+        var = np.where(keep, (x - mean) ** 2, 0.0).sum(axis=0) / m
+        std = np.maximum(np.sqrt(var), min_std)
+    return mean, var
+
+# Tracks the rest-level mean and variance of each channel's envelope and
+# derives per-channel trigger levels with hysteresis:
+#   on  = mean + k_on  * std   (channel becomes active above this)
+#   off = mean + k_off * std   (and stays active until it drops below this)
+#
+# The warm-up window is not assumed to be rest: the user may already be
+# gesturing when streaming starts. Its samples are kept and the initial
+# statistics estimated robustly by rest_statistics(). After that, only
+# samples where the channel is inactive update its statistics, clipped at
+# mean + clip * std, so neither a held gesture nor the rising edge of a
+# burst can drag the baseline up. The statistics are exponentially weighted
+# (time constant `seconds`). Each block costs O(1) per sample: thresholds
+# are fixed for the block, hysteresis is resolved with a vectorized forward
+# fill and the rest samples are folded in as one weighted batch.
+class BaselineEstimator:
+    def __init__(self, fs, channels, k_on=4.0, k_off=2.0, seconds=10.0,
+                 warmup_seconds=2.0, min_std=1e-3, clip=3.0):
+        self.k_on = k_on
+        self.k_off = k_off
+        self.clip = clip
+        self.alpha = 1.0 / (seconds * fs)
+        self.warmup = int(warmup_seconds * fs)
+        self.min_std = min_std
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.mean = np.zeros(self.channels)
+        self.var = np.zeros(self.channels)
+        self.count = np.zeros(self.channels, dtype=np.int64)
+        self.active = np.zeros(self.channels, dtype=bool)
+        self.warmup_blocks = []
+
+    @property
+    def std(self):
+        return np.maximum(np.sqrt(self.var), self.min_std)
+
+    @property
+    def on(self):
+        return self.mean + self.k_on * self.std
+
+    @property
+    def off(self):
+        return self.mean + self.k_off * self.std
+
+    @property
+    def ready(self):
+        return bool(np.all(self.count >= self.warmup))
+
+    # Returns a (samples x channels) bool array of channel activity.
+    def process(self, block):
+        n = len(block)
+        if self.ready:
+            event = np.where(block > self.on, 1, np.where(block < self.off, -1, 0))
+            rows = np.where(event != 0, np.arange(n)[:, None], -1)
+            last = np.maximum.accumulate(rows, axis=0)
+            cols = np.arange(self.channels)
+            latest = event[np.maximum(last, 0), cols] == 1
+            active = np.where(last >= 0, latest, self.active)
+        else:
+            # Warm-up: keep the samples until there are enough to estimate from
+            self.warmup_blocks.append(np.array(block, dtype=float))
+            self.count = self.count + n
+            if self.ready:
+                x = np.concatenate(self.warmup_blocks)
+                self.mean, self.var = rest_statistics(x, self.clip, self.min_std)
+                self.warmup_blocks = []
+            self.active = np.zeros(self.channels, dtype=bool)
+            return np.zeros(block.shape, dtype=bool)
+        self.active = active[-1].copy()
+
+        # Fold this block's rest samples into the statistics
+        rest = ~active
+        m = rest.sum(axis=0)
+        has_rest = m > 0
+        if np.any(has_rest):
+            block = np.minimum(block, self.mean + self.clip * self.std)
+            safe_m = np.maximum(m, 1)
+            batch_mean = np.where(rest, block, 0.0).sum(axis=0) / safe_m
+            batch_var = np.where(rest, (block - batch_mean) ** 2, 0.0).sum(axis=0) / safe_m
+            weight = np.where(has_rest, 1 - (1 - self.alpha) ** m, 0.0)
+            delta = batch_mean - self.mean
+            self.var = (1 - weight) * self.var + weight * batch_var + weight * (1 - weight) * delta ** 2
+            self.mean = self.mean + weight * delta
+            self.count = self.count + m
+        return active
+
+STAGES = {
+    "bandpass": BandPass,
+    "notch": Notch,
+    "rectify": Rectify,
+    "ema": EMAEnvelope,
+    "rms": RMSEnvelope,
+}
+
+###############################################
+# Filter Chain
+###############################################
+
+# Build a chain from a list of stage specs, e.g.
+#   [{"type": "bandpass", "low": 20, "high": 120}, {"type": "notch", "freq": 50},
+#    {"type": "rectify"}, {"type": "ema", "alpha": 0.2}]
+class FilterChain:
+    def __init__(self, spec, fs, channels):
+        self.stages = []
+        for stage in spec:
+            params = dict(stage)
+            kind = params.pop("type")
+            if kind not in STAGES:
+                raise ValueError(f"Unknown filter stage: {kind}")
+            self.stages.append(STAGES[kind](fs, channels, **params))
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, block):
+        for stage in self.stages:
+            block = stage.process(block)
+        return block
@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+from collections import Counter
+import keyboard  # pip install keyboard
+
+###############################################
+# Keystroke Output Worker
+###############################################
+
+# The only place that talks to the keyboard library. Devices submit gesture
+# decisions as (device name, key, decision time, arrival) and this thread:
+#   - owns the OS key state for all devices (a key shared by two devices is
+#     held until both let go of it),
+#   - drains everything already queued before acting, so a press that is
+#     superseded within the same frame never reaches the OS,
+#   - releases a device's key hold_time ms after its last trigger on its own
+#     timer, so a stalled BLE link cannot leave a key stuck down,
+#   - records the decision-to-keypress and arrival-to-keypress latency of
+#     every press in a latency.LatencyTracker,
+#   - reports key changes through a metrics.RateLimitedLog when given one.
+# With send_keys=False everything runs except the calls into the keyboard
+# library, for replays and benchmarks.
+class KeyOutput:
+    def __init__(self, hold_time_ms=200, latency=None, log=None, send_keys=True):
+        self.hold_time = hold_time_ms / 1000
+        self.send_keys = send_keys
+        self.queue = queue.Queue()
+        self.current = {}        # device name -> key held for that device
+        self.last_trigger = {}   # device name -> perf_counter time of its last gesture
+        self.pressed = Counter() # key -> number of devices holding it
+        self.latency = latency
+        self.log = log
+        self.events = 0
+        self.thread = None
+
+    # Called from the classifier stage for every gesture decision. Times are
+    # time.perf_counter() values; arrival is that of the deciding sample.
+    def submit(self, device_name, key, decision_time, arrival=None):
+        self.queue.put((device_name, key, decision_time, arrival))
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def report(self, message):
+        if self.log is not None:
+            self.log.emit("keys", message)
+        else:
+            print(message)
+
+    def press(self, device_name, key, decision_time, arrival):
+        if self.pressed[key] == 0:
+            if self.send_keys:
+                keyboard.press(key)
+            self.report(f"{key} pressed")
+        self.pressed[key] += 1
+        self.current[device_name] = key
+        self.events += 1
+        if self.latency is not None:
+            now = time.perf_counter()
+            self.latency.record(device_name, "output", now - decision_time)
+            if arrival is not None:
+                self.latency.record(device_name, "press", now - arrival)
+
+    def release(self, device_name, reason=""):
+        key = self.current.pop(device_name, None)
+        if key is None:
+            return
+        self.pressed[key] -= 1
+        if self.pressed[key] <= 0:
+            del self.pressed[key]
+            if self.send_keys:
+                keyboard.release(key)
+            self.report(f"{key} released{reason}")
+        self.events += 1
+
+    def release_all(self):
+        for device_name in list(self.current):
+            self.release(device_name)
+
+    # Seconds until the next hold-time release is due, or None if no key is held.
+    def next_deadline(self):
+        if not self.current:
+            return None
+        due = min(self.last_trigger[name] for name in self.current) + self.hold_time
+        return max(due - time.perf_counter(), 0.0)
+
+    def run(self):
+        running = True
+        while running:
+            try:
+                batch = [self.queue.get(timeout=self.next_deadline())]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Keep only the latest decision per device
+            latest = {}
+            for event in batch:
+                if event is None:
+                    running = False
+                    break
+                device_name, key, decision_time, arrival = event
+                self.last_trigger[device_name] = decision_time
+                if device_name not in latest or latest[device_name][0] != key:
+                    latest[device_name] = (key, decision_time, arrival)
+
+            for device_name, (key, decision_time, arrival) in latest.items():
+                held = self.current.get(device_name)
+                if held == key:
+                    continue
+                if held is not None:
+                    self.release(device_name)
+                self.press(device_name, key, decision_time, arrival)
+
+            now = time.perf_counter()
+            for device_name in list(self.current):
+                if now - self.last_trigger[device_name] >= self.hold_time:
+                    self.release(device_name, " due to inactivity")
+
+        self.release_all()
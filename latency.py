@@ -0,0 +1,74 @@
+import csv
+import json
+import threading
+from collections import deque
+import numpy as np
+
+###############################################
+# End-to-End Latency Tracking
+###############################################
+
+# Stages, all measured with time.perf_counter():
+#   decode   - notification arrival -> block decoded and buffered (BLE callback)
+#   envelope - sample arrival -> envelope crossing its trigger level detected
+#   decision - sample arrival -> classifier switching to a gesture
+#   press    - sample arrival -> keyboard.press returned
+#   output   - classifier decision -> keyboard.press returned (queue + worker)
+STAGES = ["decode", "envelope", "decision", "press", "output"]
+
+PERCENTILES = [50, 95, 99]
+
+# Rolling window of the most recent `size` latencies per device and stage.
+# record() only appends to a bounded deque so it is cheap enough for the
+# BLE callback; percentiles are computed when a snapshot is taken. Stages
+# measured in another process arrive as ready-made statistics through
+# merge() and are reported alongside the local ones.
+class LatencyTracker:
+    def __init__(self, size=2000):
+        self.size = size
+        self.samples = {}
+        self.merged = {}
+        self.lock = threading.Lock()
+
+    def record(self, device_name, stage, seconds):
+        window = self.samples.get((device_name, stage))
+        if window is None:
+            with self.lock:
+                window = self.samples.setdefault((device_name, stage), deque(maxlen=self.size))
+        window.append(seconds)
+
+    # Replace the statistics of device_name measured elsewhere, given as
+    # {stage: {"count": n, "p50": ms, ...}} like one device of a snapshot
+    def merge(self, device_name, stages):
+        with self.lock:
+            self.merged[device_name] = dict(stages)
+
+    # {device: {stage: {"count": n, "p50": ms, "p95": ms, "p99": ms}}}
+    def snapshot(self):
+        with self.lock:
+            keys = list(self.samples)
+            result = {device_name: dict(stages) for device_name, stages in self.merged.items()}
+        for device_name, stage in keys:
+            values = np.array(list(self.samples[(device_name, stage)])) * 1000
+            if len(values) == 0:
+                continue
+            stats = {"count": len(values)}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[f"p{p}"] = float(value)
+            result.setdefault(device_name, {})[stage] = stats
+        return result
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def dump_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["device", "stage", "count"] + [f"p{p}_ms" for p in PERCENTILES])
+            for device_name, stages in self.snapshot().items():
+                for stage in STAGES:
+                    if stage in stages:
+                        stats = stages[stage]
+                        writer.writerow([device_name, stage, stats["count"]] +
+                                        [f"{stats[f'p{p}']:.3f}" for p in PERCENTILES])
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+###############################################
+# Metrics Registry
+###############################################
+
+# Counters and gauges keyed by name and labels. The hot path never touches
+# the registry: devices keep plain counters and a periodic collector copies
+# them in, so reading a snapshot or serving it costs the callback nothing.
+class MetricsRegistry:
+    def __init__(self):
+        self.values = {}   # (name, sorted label items) -> value
+        self.kinds = {}    # name -> "counter" or "gauge"
+        self.help = {}     # name -> help text
+        self.lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        self.kinds[name] = kind
+        self.help[name] = help_text
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    # {"name": [{"labels": {...}, "value": v}, ...]}
+    def snapshot(self):
+        with self.lock:
+            items = list(self.values.items())
+        result = {}
+        for (name, labels), value in sorted(items):
+            result.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return result
+
+    # Look up a single value, e.g. get("npg_samples_per_second", device="npg1")
+    def get(self, name, default=None, **labels):
+        with self.lock:
+            return self.values.get((name, tuple(sorted(labels.items()))), default)
+
+    def prometheus_text(self):
+        lines = []
+        for name, entries in self.snapshot().items():
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {self.kinds.get(name, 'gauge')}")
+            for entry in entries:
+                labels = ",".join(f'{k}="{v}"' for k, v in entry["labels"].items())
+                label_text = "{" + labels + "}" if labels else ""
+                lines.append(f"{name}{label_text} {entry['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        with open(path, "w") as f:
+            json.dump({"time": time.time(), "metrics": self.snapshot()}, f, indent=2)
+
+    # Serve the registry in Prometheus text format on http://host:port/metrics
+    def serve(self, port=9100, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+###############################################
+# Rate-Limited Log
+###############################################
+
+# Messages are only appended to a deque on the calling thread. flush() prints
+# them later from a background task, at most max_per_key lines per key per
+# flush, with a summary of how many were suppressed.
+class RateLimitedLog:
+    def __init__(self, max_per_key=3, max_pending=1000):
+        self.max_per_key = max_per_key
+        self.pending = deque(maxlen=max_pending)
+
+    def emit(self, key, message):
+        self.pending.append((key, message))
+
+    def flush(self):
+        shown = {}
+        suppressed = {}
+        while self.pending:
+            key, message = self.pending.popleft()
+            if shown.get(key, 0) < self.max_per_key:
+                shown[key] = shown.get(key, 0) + 1
+                print(message)
+            else:
+                suppressed[key] = suppressed.get(key, 0) + 1
+        for key, count in suppressed.items():
+            print(f"({count} more '{key}' messages suppressed)")
@@ -0,0 +1,800 @@
+import asyncio
+import fnmatch
+import threading
+import time
+from collections import deque
+import numpy as np
+from bleak import BleakScanner, BleakClient
+from pylsl import StreamInfo, StreamOutlet, local_clock
+from classifier import Classifier, ThresholdModel, load_model
+from dsp import BaselineEstimator, FilterChain
+from keyout import KeyOutput
+from latency import LatencyTracker
+from metrics import MetricsRegistry, RateLimitedLog
+from replay import NotificationCapture
+from ringbuffer import RingBuffer
+from sequencer import Sequencer
+
+###############################################
+# Device List
+###############################################
+
+# One entry per NPG armband. Keys are passed to Device() as keyword arguments.
+# "device_name" is the advertised name, matched exactly (ignoring case) unless
+# it contains * or ? wildcards, e.g. "NPG-*"; empty matches any NPG service.
+# "keys" maps gesture classes 1..N to keyboard keys (class 0 is rest).
+# "model" is an optional path to a saved classifier (see classifier.py); without
+# it the two-gesture threshold rule on channel1 vs channel3 is used.
+# "capture" is an optional path to record raw notifications to, for replay.py.
+# "channels", "sample_rate" and "block" describe the firmware's packet format
+# and default to CHANNELS, SAMPLE_RATE and BLOCK_COUNT below.
+DEVICES = [
+    {"name": "npg1", "device_name": "NPG-30:30:f9:f9:e1:2e", "keys": ["k", "i"]},
+    {"name": "npg2", "device_name": "NPG-30:30:f9:f9:db:6e", "keys": ["j", "l"]},
+]
+
+###############################################
+# Utility and Timing Functions
+###############################################
+
+# Hold time (in ms): if no envelope above threshold is seen for this duration, release key.
+HOLD_TIME = 200
+
+# Normalize a raw 12-bit ADC sample (range ~0-4095) to roughly -1 to 1.
+def normalize_sample(sample):
+    a = 2**12  # 4096
+    return (sample - a/2) * (2 / a)
+
+# Smoothing constant (alpha) for exponential moving average
+ALPHA = 0.2
+
+# Mains frequency to notch out (50 Hz or 60 Hz depending on the country)
+MAINS_FREQ = 50
+
+# Default per-device filter chain, applied to normalized samples (see dsp.py)
+DEFAULT_FILTERS = [
+    {"type": "bandpass", "low": 20.0, "high": 120.0},
+    {"type": "notch", "freq": MAINS_FREQ},
+]
+
+# Default envelope stages, applied to the filtered signal
+DEFAULT_ENVELOPE = [
+    {"type": "rectify"},
+    {"type": "ema", "alpha": ALPHA},
+]
+
+# Adaptive thresholds for the default two-gesture rule: a channel triggers at
+# K_ON standard deviations above its rest level and releases below K_OFF.
+ADAPTIVE_THRESHOLDS = True
+K_ON = 4.0
+K_OFF = 2.0
+
+# Classifier windowing and time budget per inference (in ms). Windows are
+# converted to samples at each device's sample rate.
+CLASSIFIER_WINDOW_MS = 200
+CLASSIFIER_HOP_MS = 40
+INFERENCE_BUDGET_MS = 2.0
+
+###############################################
+# BLE and Packet Parameters
+###############################################
+
+SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
+DATA_CHAR_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
+CONTROL_CHAR_UUID = "0000ff01-0000-1000-8000-00805f9b34fb"
+
+# Default packet format of the 3-channel firmware. Other firmware is
+# described per device in DEVICES.
+CHANNELS = 3
+SINGLE_SAMPLE_LEN = 1 + 2 * CHANNELS  # Each sample is 7 bytes
+BLOCK_COUNT = 10                      # 10 samples per notification
+NEW_PACKET_LEN = SINGLE_SAMPLE_LEN * BLOCK_COUNT  # Total packet length
+SAMPLE_RATE = 250
+
+# Reconnect parameters (in seconds)
+SCAN_TIMEOUT = 5.0            # Give up a scan after this long
+CONNECT_TIMEOUT = 3.0         # Give up a direct connect to a cached address after this long
+RECONNECT_MIN_DELAY = 0.25    # First retry delay after a failure
+RECONNECT_MAX_DELAY = 5.0     # Backoff doubles up to this limit
+STALL_TIMEOUT = 2.0           # Force a reconnect if no notification arrives for this long
+STOP_TIMEOUT = 2.0            # Time allowed for STOP and unsubscribing when the engine stops
+
+# Packet-loss handling: samples up to REORDER_WINDOW late are put back in
+# order, gaps up to MAX_FILL samples are filled ("linear", "hold" or "none")
+REORDER_WINDOW = 0
+GAP_FILL = "linear"
+MAX_FILL = 25
+
+# Add a fourth LSL channel that is 1.0 for synthetic (gap-filled) samples
+LSL_SYNTHETIC_CHANNEL = True
+
+# Metrics: collection interval (s), optional Prometheus port and JSON file
+METRICS_INTERVAL = 1.0
+METRICS_PORT = None           # e.g. 9100 to serve http://127.0.0.1:9100/metrics
+METRICS_FILE = None           # e.g. "metrics.json", rewritten every interval
+
+# Seconds of samples buffered between the BLE callback and the DSP/classifier stage
+RING_SECONDS = 4.0
+
+# Layout of one sample: Byte0 is packet counter, followed by one big-endian
+# 16-bit ADC value per channel (bytes 1-2, 3-4, 5-6 for 3 channels)
+def sample_dtype(channels):
+    return np.dtype([("counter", "u1"), ("channels", ">i2", (channels,))])
+
+SAMPLE_DTYPE = sample_dtype(CHANNELS)
+
+# Parse a whole notification (any multiple of the sample size) in one step.
+# Returns a (N,) counter vector and a (N, channels) int16 channel array, viewed
+# straight over the notification buffer without slicing it into per-sample copies.
+def decode_block(data, dtype=SAMPLE_DTYPE):
+    block = np.frombuffer(data, dtype=dtype)
+    return block["counter"], block["channels"].astype(np.int16)
+
+###############################################
+# Per-Device State
+###############################################
+
+class Device:
+    def __init__(self, name, device_name, keys,
+                 stream_name="NPG", lsl_mode="notification", lsl_interval_ms=40,
+                 stall_timeout=STALL_TIMEOUT, filters=None, envelope=None, model=None,
+                 capture=None, channels=CHANNELS, sample_rate=SAMPLE_RATE, block=BLOCK_COUNT):
+        self.name = name
+        self.device_name = device_name
+        self.keys = list(keys)  # keys[i] is pressed for gesture class i + 1
+
+        # Packet format: notifications carry up to `block` samples of
+        # `channels` values each
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.block = block
+        self.dtype = sample_dtype(channels)
+        self.sample_len = self.dtype.itemsize
+        self.packet_len = self.sample_len * block
+
+        # Streaming filter chain, envelope stages and the latest envelope value
+        # for each channel
+        self.filters = FilterChain(filters if filters is not None else DEFAULT_FILTERS, sample_rate, channels)
+        self.envelope = FilterChain(envelope if envelope is not None else DEFAULT_ENVELOPE, sample_rate, channels)
+        self.envelopes = np.zeros(channels)
+
+        # Online rest-level statistics and trigger levels per channel
+        self.baseline = BaselineEstimator(sample_rate, channels, k_on=K_ON, k_off=K_OFF)
+
+        # Gesture classifier, windowed in samples at this device's rate
+        self.classifier_window = max(int(CLASSIFIER_WINDOW_MS * sample_rate / 1000), 2)
+        self.classifier_hop = max(int(CLASSIFIER_HOP_MS * sample_rate / 1000), 1)
+        self.set_model(load_model(model) if model else None)
+
+        # Calibration recorder (see calibration.py). While set, samples are
+        # recorded and no keys are pressed.
+        self.recorder = None
+
+        # Raw notification capture (see replay.py), written on the BLE callback
+        self.capture = NotificationCapture(capture, name, sample_rate, channels, block) if capture else None
+
+        # Raw decoded samples waiting for the consumer stage. data_ready is
+        # shared by all devices of an engine and set after every write.
+        self.buffer = RingBuffer(int(RING_SECONDS * sample_rate), channels)
+        self.data_ready = None
+
+        # Counter unrolling, reordering and gap filling
+        self.sequencer = Sequencer(sample_rate, REORDER_WINDOW, GAP_FILL, MAX_FILL)
+
+        # Counter tracking. These plain counters are the hot-path side of the
+        # metrics; the engine copies them into its registry periodically.
+        self.samples_total = 0
+        self.start_time = None
+        self.total_missing_samples = 0
+        self.callbacks = 0
+        self.callback_seconds = 0.0
+
+        # Rate-limited log, flushed by the engine off the hot path
+        self.log = RateLimitedLog()
+
+        # Keystroke output worker and latency tracker, shared by all devices
+        # of an engine
+        self.keyout = None
+        self.latency = None
+        self.last_gesture = 0
+
+        # LSL output mode for this device:
+        #   "off"          - do not push to LSL (no outlet is created)
+        #   "sample"       - one push_sample per sample
+        #   "notification" - one push_chunk per BLE notification
+        #   "interval"     - accumulate and push_chunk every lsl_interval_ms
+        self.lsl_mode = lsl_mode
+        self.lsl_interval_ms = lsl_interval_ms
+        self.lsl_pending = []
+        self.lsl_pending_ts = []
+        self.lsl_pending_since = 0.0  # time.monotonic() of the oldest pending row
+        self.lsl_last_push = 0.0
+        labels = [f"ch{i + 1}" for i in range(channels)] + (["synthetic"] if LSL_SYNTHETIC_CHANNEL else [])
+        info = StreamInfo(stream_name, "EXG", len(labels), sample_rate, "float32", f"uid007-{name}")
+        channels_desc = info.desc().append_child("channels")
+        for label in labels:
+            channels_desc.append_child("channel").append_child_value("label", label)
+        info.desc().append_child_value("block_size", str(block))
+        self.outlet = StreamOutlet(info) if lsl_mode != "off" else None
+
+        # Connection state. address is the last resolved BLE address, used to
+        # reconnect directly without scanning.
+        self.connected = False
+        self.address = None
+        self.reconnects = 0
+        self.reconnect_durations = deque(maxlen=100)  # seconds from drop to data flowing again
+
+        # Data-stall watchdog: monotonic time of the last notification
+        self.stall_timeout = stall_timeout
+        self.last_notification = 0.0
+        self.stalls = 0
+
+    # Swap in a new gesture model; None selects the default threshold rule.
+    def set_model(self, model):
+        if model is None:
+            model = ThresholdModel(adaptive=ADAPTIVE_THRESHOLDS)
+        self.classifier = Classifier(model, channels=self.channels,
+                                     window=self.classifier_window, hop=self.classifier_hop,
+                                     budget_ms=INFERENCE_BUDGET_MS)
+
+    # Match on the advertised name, or on the NPG service UUID when the
+    # device list entry has no device_name. Names are compared whole, so
+    # "NPG-1" does not claim "NPG-10"; wildcards have to be asked for.
+    def matches(self, ble_device, adv=None):
+        name = ble_device.name or (adv.local_name if adv is not None else None)
+        if self.device_name:
+            return bool(name) and fnmatch.fnmatchcase(name.lower(), self.device_name.lower())
+        return adv is not None and SERVICE_UUID in adv.service_uuids
+
+    # Push a block of enveloped samples according to lsl_mode.
+    def push_lsl(self, enveloped, timestamps, synthetic):
+        if self.lsl_mode == "off":
+            return
+        arrival = timestamps[-1]
+        timestamps = timestamps.tolist()
+        if LSL_SYNTHETIC_CHANNEL:
+            enveloped = np.column_stack((enveloped, synthetic))
+        rows = enveloped.tolist()
+
+        if self.lsl_mode == "sample":
+            for row, ts in zip(rows, timestamps):
+                self.outlet.push_sample(row, ts)
+        elif self.lsl_mode == "notification":
+            self.outlet.push_chunk(rows, timestamps)
+        elif self.lsl_mode == "interval":
+            if not self.lsl_pending:
+                self.lsl_pending_since = time.monotonic()
+            self.lsl_pending.extend(rows)
+            self.lsl_pending_ts.extend(timestamps)
+            if (arrival - self.lsl_last_push) * 1000 >= self.lsl_interval_ms:
+                self.flush_lsl(force=True)
+        else:
+            self.log.emit("lsl", f"[{self.name}] Unknown LSL mode: {self.lsl_mode}")
+
+    # Push what "interval" mode is holding back once it has waited
+    # lsl_interval_ms, so a stall or disconnect does not keep the last
+    # partial interval until the next block; force pushes it right away.
+    # Called from the consumer thread, like push_lsl().
+    def flush_lsl(self, force=False):
+        if not self.lsl_pending:
+            return
+        if force or (time.monotonic() - self.lsl_pending_since) * 1000 >= self.lsl_interval_ms:
+            self.outlet.push_chunk(self.lsl_pending, self.lsl_pending_ts)
+            self.lsl_last_push = self.lsl_pending_ts[-1]
+            self.lsl_pending.clear()
+            self.lsl_pending_ts.clear()
+
+    # Hand gesture decisions to the keystroke worker, which owns press,
+    # release and HOLD_TIME timing. Rest decisions need no message: the key
+    # is released once no gesture has been seen for HOLD_TIME.
+    def update_keys(self, gesture, arrival):
+        now = time.perf_counter()
+        if gesture != self.last_gesture and gesture != 0 and self.latency is not None:
+            self.latency.record(self.name, "decision", now - arrival)
+        self.last_gesture = gesture
+
+        # Gesture classes without a mapped key behave like rest
+        if 0 < gesture <= len(self.keys) and self.keyout is not None:
+            self.keyout.submit(self.name, self.keys[gesture - 1], now, arrival)
+
+    # Consumer stage: DSP, LSL output and classification for a block read
+    # from the ring buffer.
+    def process_block(self, counters, channels, timestamps, arrivals):
+        unrolled, channels, timestamps, arrivals, synthetic, reset_at = \
+            self.sequencer.process(counters, channels, timestamps, arrivals)
+        for expected, got in self.sequencer.gaps:
+            self.log.emit("missing", f"[{self.name}] Missing sample: expected {expected}, got {got}")
+        self.total_missing_samples = self.sequencer.missing
+        if len(unrolled) == 0:
+            return
+
+        if self.start_time is None:
+            self.start_time = time.time()
+
+        # A gap too long to fill: finish the samples before it, then restart
+        # the filters so they do not ring across the discontinuity.
+        if reset_at is not None:
+            if reset_at > 0:
+                self.process_samples(channels[:reset_at], timestamps[:reset_at],
+                                     arrivals[:reset_at], synthetic[:reset_at])
+            self.filters.reset()
+            self.envelope.reset()
+            self.reset_decisions()
+            channels, timestamps = channels[reset_at:], timestamps[reset_at:]
+            arrivals, synthetic = arrivals[reset_at:], synthetic[reset_at:]
+        self.process_samples(channels, timestamps, arrivals, synthetic)
+
+    # Push any LSL samples still held back and finish writing the capture
+    # file, if any. Later runs do not capture.
+    def close(self):
+        self.flush_lsl(force=True)
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+    # Forget classifier history after a discontinuity
+    def reset_decisions(self):
+        self.classifier.reset()
+
+    def process_samples(self, channels, timestamps, arrivals, synthetic):
+        filtered, enveloped, active = self.condition(channels, timestamps, arrivals, synthetic)
+        self.decide(channels, filtered, enveloped, active, timestamps, arrivals)
+
+    # DSP stage: filters, envelope, trigger levels and LSL output. Returns the
+    # filtered signal, its envelope and the per-channel activity.
+    def condition(self, channels, timestamps, arrivals, synthetic):
+        # Normalize and run the filter chain over the whole block at once
+        filtered = self.filters.process(normalize_sample(channels))
+        enveloped = self.envelope.process(filtered)
+        self.envelopes[:] = enveloped[-1]
+        previously_active = self.baseline.active
+        active = self.baseline.process(enveloped)
+        if self.latency is not None:
+            # Rows where some channel crosses its trigger level
+            before = np.vstack((previously_active, active[:-1]))
+            crossings = np.flatnonzero(np.any(active & ~before, axis=1))
+            if len(crossings):
+                now = time.perf_counter()
+                for i in crossings:
+                    self.latency.record(self.name, "envelope", now - arrivals[i])
+
+        # Send data via LSL outlet (if needed)
+        self.push_lsl(enveloped, timestamps, synthetic)
+        self.samples_total += len(enveloped)
+        return filtered, enveloped, active
+
+    # Decision stage: calibration recording, or classification and keys.
+    def decide(self, channels, filtered, enveloped, active, timestamps, arrivals):
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(self.name, np.round(channels), filtered, timestamps)
+            return
+
+        for i, gesture in self.classifier.process(filtered, enveloped, active):
+            self.update_keys(gesture, arrivals[i])
+
+    # Producer stage, on the BLE callback: decode and hand off to the ring
+    # buffer, nothing else. Timestamps are back-computed from the arrival time
+    # of the notification: the newest sample is stamped with it and earlier
+    # ones 1/sample_rate apart according to their counters. arrival is on the
+    # LSL clock and defaults to now; replay passes the captured one, so gaps
+    # between notifications are the same as when they were recorded. Any
+    # whole number of samples up to a full block is accepted.
+    def notification_handler(self, sender, data: bytearray, arrival=None):
+        received = time.perf_counter()
+        self.last_notification = time.monotonic()
+        if arrival is None:
+            arrival = local_clock()
+        if self.capture is not None:
+            self.capture.write(data, received)
+        if 0 < len(data) <= self.packet_len and len(data) % self.sample_len == 0:
+            counters, channels = decode_block(data, self.dtype)
+            timestamps = arrival - ((counters[-1] - counters.astype(np.int64)) % 256) / self.sample_rate
+            self.buffer.write(counters, channels, timestamps, received)
+            if self.data_ready is not None:
+                self.data_ready.set()
+            if self.latency is not None:
+                self.latency.record(self.name, "decode", time.perf_counter() - received)
+        else:
+            self.log.emit("length", f"[{self.name}] Unexpected packet length: {len(data)} "
+                                    f"(expected up to {self.block} samples of {self.sample_len} bytes)")
+        self.callbacks += 1
+        self.callback_seconds += time.perf_counter() - received
+
+###############################################
+# Transports
+###############################################
+
+# What the engine connects through. client is called like BleakClient
+# (target, timeout=..., disconnected_callback=...) and must return an async
+# context manager with is_connected, write_gatt_char and start_notify.
+# scanner provides BleakScanner's discover(timeout, return_adv=True) and
+# find_device_by_filter(filter, timeout); None means addresses are preset
+# and never scanned for. replay.py and simulator.py provide transports too.
+class Transport:
+    def __init__(self, client, scanner=None):
+        self.client = client
+        self.scanner = scanner
+
+BLE = Transport(BleakClient, BleakScanner)
+
+###############################################
+# Acquisition Engine
+###############################################
+
+# Runs every configured device from a single asyncio loop. One shared scan
+# resolves device addresses at startup, then each device gets its own task
+# that keeps it connected. send_keys=False keeps gestures away from the OS
+# keyboard, for replays, simulations and benchmarks. device_class lets
+# workers.py substitute its own Device subclasses.
+class AcquisitionEngine:
+    def __init__(self, devices=None, transport=BLE, send_keys=True, device_class=Device):
+        if devices is None:
+            devices = DEVICES
+        self.devices = [device_class(**cfg) for cfg in devices]
+        self.transport = transport
+        self.scan_lock = None
+
+        # Lifecycle: "stopped", "running" or "stopping". start() runs the
+        # engine on its own thread; run() can also be awaited directly.
+        self.state = "stopped"
+        self.thread = None
+        self.loop = None
+        self.stop_requested = None
+        self.consumer = None
+        self.consuming = False
+        self.metrics_server = None
+
+        # Wakes the consumer thread when any device has new samples
+        self.data_ready = threading.Event()
+        # Metrics, log, latency tracking and the single keystroke output worker
+        # for all devices
+        self.metrics = MetricsRegistry()
+        self.log = RateLimitedLog()
+        self.latency = LatencyTracker()
+        self.keyout = KeyOutput(HOLD_TIME, self.latency, self.log, send_keys)
+        for device in self.devices:
+            device.data_ready = self.data_ready
+            device.keyout = self.keyout
+            device.latency = self.latency
+            device.log = self.log
+        self.describe_metrics()
+        self.last_collect = None
+
+    def get(self, name):
+        for device in self.devices:
+            if device.name == name:
+                return device
+        raise KeyError(name)
+
+    # Consumer thread: drain every device's ring buffer and run the DSP and
+    # classifier stage off the BLE callback. It wakes at least every 50 ms,
+    # which also pushes interval-mode LSL data when the stream stalls.
+    def consume(self):
+        while self.consuming:
+            self.data_ready.wait(0.05)
+            self.data_ready.clear()
+            for device in self.devices:
+                if len(device.buffer):
+                    device.process_block(*device.buffer.read())
+                device.flush_lsl()
+
+    def describe_metrics(self):
+        describe = self.metrics.describe
+        describe("npg_samples_total", "counter", "Samples processed")
+        describe("npg_samples_per_second", "gauge", "Samples processed per second")
+        describe("npg_missing_samples_total", "counter", "Samples lost according to the packet counter")
+        describe("npg_connected", "gauge", "1 while the device is connected")
+        describe("npg_reconnects_total", "counter", "Successful reconnects after a drop")
+        describe("npg_reconnect_seconds", "gauge", "Duration of the last reconnect")
+        describe("npg_stalls_total", "counter", "Reconnects forced by the data-stall watchdog")
+        describe("npg_ring_buffer_depth", "gauge", "Samples waiting for the DSP stage")
+        describe("npg_ring_buffer_high_water", "gauge", "Largest ring buffer fill level")
+        describe("npg_ring_buffer_overflows_total", "counter", "Samples dropped because the ring buffer was full")
+        describe("npg_callback_seconds_avg", "gauge", "Mean BLE notification callback duration")
+        describe("npg_classifier_overruns_total", "counter", "Inferences over the time budget")
+        describe("npg_key_events_total", "counter", "Key presses and releases sent to the OS")
+        describe("npg_key_queue_depth", "gauge", "Decisions waiting for the keystroke worker")
+
+    # Copy the devices' plain counters into the registry.
+    def collect(self):
+        now = time.monotonic()
+        elapsed = None if self.last_collect is None else now - self.last_collect[0]
+        previous = {} if self.last_collect is None else self.last_collect[1]
+        totals = {}
+        set_metric = self.metrics.set
+        for device in self.devices:
+            name = device.name
+            totals[name] = device.samples_total
+            set_metric("npg_samples_total", device.samples_total, device=name)
+            if elapsed:
+                rate = (device.samples_total - previous.get(name, 0)) / elapsed
+                set_metric("npg_samples_per_second", round(rate, 1), device=name)
+            set_metric("npg_missing_samples_total", device.total_missing_samples, device=name)
+            set_metric("npg_connected", int(device.connected), device=name)
+            set_metric("npg_reconnects_total", device.reconnects, device=name)
+            if device.reconnect_durations:
+                set_metric("npg_reconnect_seconds", round(device.reconnect_durations[-1], 3), device=name)
+            set_metric("npg_stalls_total", device.stalls, device=name)
+            set_metric("npg_ring_buffer_depth", len(device.buffer), device=name)
+            set_metric("npg_ring_buffer_high_water", device.buffer.high_water, device=name)
+            set_metric("npg_ring_buffer_overflows_total", device.buffer.overflows, device=name)
+            if device.callbacks:
+                set_metric("npg_callback_seconds_avg", device.callback_seconds / device.callbacks, device=name)
+            set_metric("npg_classifier_overruns_total", device.classifier.overruns, device=name)
+        set_metric("npg_key_events_total", self.keyout.events)
+        set_metric("npg_key_queue_depth", self.keyout.queue.qsize())
+        self.last_collect = (now, totals)
+
+    # Periodic collector: refresh metrics, flush the log and write the
+    # metrics file if one is configured.
+    async def report(self):
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            self.collect()
+            self.log.flush()
+            if METRICS_FILE:
+                self.metrics.write_file(METRICS_FILE)
+
+    # Scan until the first advertisement matching this device, then stop.
+    # Scans are serialized because most BLE stacks reject concurrent scans.
+    async def find(self, device):
+        if self.transport.scanner is None:
+            return None
+        async with self.scan_lock:
+            print(f"[{device.name}] Scanning...")
+            return await self.transport.scanner.find_device_by_filter(device.matches, timeout=SCAN_TIMEOUT)
+
+    # Sleep until the device has been silent for stall_timeout, then end the
+    # session. Wakes up at most once per timeout window.
+    async def watchdog(self, device, disconnected):
+        while not disconnected.is_set():
+            remaining = device.last_notification + device.stall_timeout - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            print(f"[{device.name}] No data for {device.stall_timeout:.1f} s, forcing reconnect")
+            device.stalls += 1
+            disconnected.set()
+
+    # Connect, start streaming and stay connected until the link drops or
+    # the watchdog sees a stall. Returns True if the device was streaming at
+    # some point.
+    async def session(self, device, target, lost_at):
+        streaming = False
+        disconnected = asyncio.Event()
+        try:
+            async with self.transport.client(target, timeout=CONNECT_TIMEOUT,
+                                             disconnected_callback=lambda _: disconnected.set()) as client:
+                if not client.is_connected:
+                    print(f"[{device.name}] Failed to connect.")
+                    return False
+                device.connected = True
+                print(f"[{device.name}] Connected to", target)
+                await client.write_gatt_char(CONTROL_CHAR_UUID, b"START", response=True)
+                print(f"[{device.name}] Sent START command")
+                await client.start_notify(DATA_CHAR_UUID, device.notification_handler)
+                print(f"[{device.name}] Subscribed to data notifications")
+                streaming = True
+                if lost_at is not None:
+                    duration = time.monotonic() - lost_at
+                    device.reconnects += 1
+                    device.reconnect_durations.append(duration)
+                    print(f"[{device.name}] Reconnected in {duration:.2f} s")
+                # Stay in the connection until it drops or stalls.
+                device.last_notification = time.monotonic()
+                watchdog = asyncio.create_task(self.watchdog(device, disconnected))
+                try:
+                    await disconnected.wait()
+                except asyncio.CancelledError:
+                    # The engine is stopping: leave the device idle, not streaming
+                    await self.release(device, client)
+                    raise
+                finally:
+                    watchdog.cancel()
+        except Exception as e:
+            print(f"[{device.name}] Connection error:", e)
+        finally:
+            device.connected = False
+        return streaming
+
+    # Unsubscribe and send STOP, giving up after STOP_TIMEOUT. The link may
+    # already be gone, so errors are only reported.
+    async def release(self, device, client):
+        async def stop_streaming():
+            await client.stop_notify(DATA_CHAR_UUID)
+            await client.write_gatt_char(CONTROL_CHAR_UUID, b"STOP", response=True)
+        try:
+            await asyncio.wait_for(stop_streaming(), STOP_TIMEOUT)
+            print(f"[{device.name}] Sent STOP command")
+        except Exception as e:
+            print(f"[{device.name}] Could not stop streaming:", e)
+
+    # Keep one device connected. Reconnects go straight to the cached address
+    # first; only if that fails is a filtered scan run, with exponential backoff
+    # between failed attempts.
+    async def maintain(self, device):
+        delay = RECONNECT_MIN_DELAY
+        lost_at = None
+        while True:
+            target = device.address
+            if target is None:
+                try:
+                    found = await self.find(device)
+                except Exception as e:
+                    print(f"[{device.name}] Scan error:", e)
+                    found = None
+                if found is not None:
+                    print(f"[{device.name}] Found device:", found)
+                    device.address = target = found.address
+
+            if target is not None:
+                if await self.session(device, target, lost_at):
+                    # The link was up: reconnect immediately to the cached address.
+                    print(f"[{device.name}] Connection lost, reconnecting...")
+                    lost_at = time.monotonic()
+                    delay = RECONNECT_MIN_DELAY
+                    continue
+                # The cached address did not work; scan again next time.
+                device.address = None
+            else:
+                print(f"[{device.name}] Device not found.")
+
+            print(f"[{device.name}] Retrying in {delay:.2f} seconds...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    # Resolve addresses and keep every device connected
+    async def connect_devices(self):
+        # One shared scan resolves the addresses of every device that is nearby;
+        # the rest fall back to their own targeted scans.
+        found = {}
+        if self.transport.scanner is not None and any(device.address is None for device in self.devices):
+            try:
+                print("Scanning for BLE devices...")
+                found = await self.transport.scanner.discover(timeout=SCAN_TIMEOUT, return_adv=True)
+            except Exception as e:
+                print("Scan error:", e)
+        for device in self.devices:
+            if device.address is not None:
+                continue
+            for ble_device, adv in found.values():
+                if device.matches(ble_device, adv):
+                    print(f"[{device.name}] Found device:", ble_device)
+                    device.address = ble_device.address
+                    break
+
+        await asyncio.gather(*(self.maintain(device) for device in self.devices))
+
+    # Tasks that keep the devices streaming; cancelled when the engine stops
+    async def start_devices(self):
+        return [asyncio.create_task(self.connect_devices())]
+
+    # Called after those tasks have been cancelled
+    async def stop_devices(self):
+        pass
+
+    # Run until request_stop() (or until cancelled), then shut everything
+    # down: device tasks (which unsubscribe and send STOP), the consumer
+    # thread, the keystroke worker, which releases any held keys, and the
+    # metrics server. Startup runs inside the same try, so if any part of it
+    # fails (e.g. the metrics port is taken) the parts already started are
+    # shut down too and the engine still ends up stopped.
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_requested = asyncio.Event()
+        self.scan_lock = asyncio.Lock()
+        self.state = "running"
+        self.consuming = True
+        self.consumer = None
+        tasks = []
+        try:
+            self.consumer = threading.Thread(target=self.consume, daemon=True)
+            self.consumer.start()
+            self.keyout.start()
+            if METRICS_PORT and self.metrics_server is None:
+                self.metrics_server = self.metrics.serve(METRICS_PORT)
+            tasks.append(asyncio.create_task(self.report()))
+            tasks += await self.start_devices()
+            await self.stop_requested.wait()
+        finally:
+            self.state = "stopping"
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.stop_devices()
+            self.consuming = False
+            self.data_ready.set()
+            if self.consumer is not None and self.consumer.is_alive():
+                self.consumer.join()
+            self.keyout.stop()
+            # Free the port, so the next engine can serve on it
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
+                self.metrics_server = None
+            for device in self.devices:
+                device.close()
+            self.collect()
+            self.log.flush()
+            self.state = "stopped"
+
+    # Ask a running engine to stop; safe to call from any thread, and a
+    # no-op once the engine's event loop has finished.
+    def request_stop(self):
+        loop = self.loop
+        if loop is None or self.stop_requested is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self.stop_requested.set)
+        except RuntimeError:
+            # The loop closed between the check and the call
+            pass
+
+    def ble_thread(self):
+        asyncio.run(self.run())
+
+    # Run the engine on a background thread. Returns False if it is already
+    # running, so repeated starts never duplicate devices or threads.
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self.state = "running"
+        self.loop = self.stop_requested = None
+        self.thread = threading.Thread(target=self.ble_thread, daemon=True)
+        self.thread.start()
+        return True
+
+    # Stop the engine and wait for its thread. Returns False if the engine
+    # did not stop within timeout seconds.
+    def stop(self, timeout=10.0):
+        if self.thread is None:
+            return True
+        while self.stop_requested is None and self.thread.is_alive():
+            time.sleep(0.01)
+        if self.thread.is_alive():
+            self.request_stop()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            return False
+        self.thread = None
+        return True
+
+    def restart(self):
+        self.stop()
+        return self.start()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # Summary for UIs and scripts
+    def status(self):
+        return {
+            "state": self.state,
+            "keys_held": sorted(self.keyout.pressed),
+            "devices": {
+                device.name: {
+                    "connected": device.connected,
+                    "samples_total": device.samples_total,
+                    "missing_samples": device.total_missing_samples,
+                    "reconnects": device.reconnects,
+                    "stalls": device.stalls,
+                }
+                for device in self.devices
+            },
+        }
+
+###############################################
+# Main Execution: Start BLE Acquisition Thread
+###############################################
+
+if __name__ == "__main__":
+    engine = AcquisitionEngine()
+    engine.start()
+    # Main thread simply idles until Ctrl+C, then shuts down cleanly.
+    try:
+        while engine.running:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        engine.stop()
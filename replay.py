@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import functools
+import json
+import struct
+import time
+
+from pylsl import local_clock
+
+###############################################
+# Capture Format
+###############################################
+
+# A capture file is a magic line, one JSON metadata line, then one record
+# per BLE notification:
+#   float64 arrival time (seconds since the capture started), little-endian
+#   uint16  payload length
+#   payload bytes, exactly as received from the data characteristic
+MAGIC = b"NPGCAP1\n"
+RECORD_HEADER = struct.Struct("<dH")
+
+# Appends raw notifications to a capture file. Writes go through Python's
+# file buffer, so the cost in the BLE callback is a small memory copy.
+class NotificationCapture:
+    def __init__(self, path, device_name="", sample_rate=250, channels=3, block=10):
+        self.file = open(path, "wb")
+        self.start = time.perf_counter()
+        self.file.write(MAGIC)
+        meta = {"device": device_name, "sample_rate": sample_rate, "channels": channels,
+                "block": block, "created": time.time()}
+        self.file.write((json.dumps(meta) + "\n").encode())
+
+    def write(self, data, arrival=None):
+        if arrival is None:
+            arrival = time.perf_counter()
+        self.file.write(RECORD_HEADER.pack(arrival - self.start, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+# Returns (metadata, [(arrival, payload), ...])
+def read_capture(path):
+    with open(path, "rb") as f:
+        if f.readline() != MAGIC:
+            raise ValueError(f"{path} is not an NPG capture file")
+        meta = json.loads(f.readline())
+        records = []
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            arrival, length = RECORD_HEADER.unpack(header)
+            records.append((arrival, f.read(length)))
+    return meta, records
+
+###############################################
+# Replay Client
+###############################################
+
+# Replay settings and progress, shared by the clients of one transport:
+#   speed = 1.0  -> real time, as captured
+#   speed = N    -> N times faster
+#   speed = 0    -> as fast as the consumer keeps up: when the handler is a
+#                   Device's, playback waits while its ring buffer is more
+#                   than a quarter full instead of overflowing it
+# Paths that have been played to the end are listed in completed; with
+# repeat=False they refuse further connects so an engine does not replay
+# them forever.
+class Replay:
+    def __init__(self, speed=1.0, repeat=False):
+        self.speed = speed
+        self.repeat = repeat
+        self.completed = set()
+
+    def transport(self):
+        import npg
+        return npg.Transport(functools.partial(ReplayClient, self))
+
+# Stands in for BleakClient, as Replay.transport(): the "address" is a
+# capture file path, and start_notify() feeds its notifications to the
+# handler, each with its captured arrival time moved onto the LSL clock.
+# When the capture ends the client disconnects.
+class ReplayClient:
+    def __init__(self, replay, address, timeout=None, disconnected_callback=None):
+        self.replay = replay
+        self.address = address
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def connect(self):
+        if self.address in self.replay.completed and not self.replay.repeat:
+            raise ConnectionError(f"Replay of {self.address} finished")
+        self.meta, self.records = read_capture(self.address)
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.is_connected:
+            self.is_connected = False
+            if self.disconnected_callback is not None:
+                self.disconnected_callback(self)
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        pass
+
+    async def start_notify(self, uuid, handler):
+        self.task = asyncio.create_task(self.play(handler))
+
+    async def stop_notify(self, uuid):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def play(self, handler):
+        speed = self.replay.speed
+        buffer = getattr(getattr(handler, "__self__", None), "buffer", None)
+        start = time.perf_counter()
+        base = local_clock()
+        for arrival, payload in self.records:
+            if speed:
+                delay = arrival / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif buffer is not None:
+                while len(buffer) > buffer.capacity // 4:
+                    await asyncio.sleep(0.001)
+            else:
+                await asyncio.sleep(0)
+            handler(self.address, bytearray(payload), base + arrival)
+        self.replay.completed.add(self.address)
+        self.task = None
+        await self.disconnect()
+
+###############################################
+# Offline Replay
+###############################################
+
+# Push a capture through one Device's full pipeline synchronously, with no
+# event loop or threads: every notification is decoded and immediately
+# processed. Deterministic, and the fastest way to replay.
+def replay_offline(device, path):
+    meta, records = read_capture(path)
+    base = local_clock()
+    for arrival, payload in records:
+        device.notification_handler(None, bytearray(payload), base + arrival)
+        if len(device.buffer):
+            device.process_block(*device.buffer.read())
+    return len(records)
+
+# Replay captures through a full AcquisitionEngine, as if the devices were
+# connected. The engine needs replay.transport() as its transport; captures
+# maps device name -> capture path.
+async def replay_engine(engine, captures, replay):
+    replay.completed.clear()
+    for device in engine.devices:
+        device.address = captures[device.name]
+    task = asyncio.create_task(engine.run())
+    try:
+        while not set(captures.values()) <= replay.completed:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.05)
+        # Let the consumer drain what is still buffered
+        while any(len(device.buffer) for device in engine.devices):
+            await asyncio.sleep(0.01)
+    finally:
+        engine.request_stop()
+        await task
+
+###############################################
+# Command Line
+###############################################
+
+# python replay.py npg1=npg1.npgcap npg2=npg2.npgcap --speed 10
+if __name__ == "__main__":
+    import npg
+
+    parser = argparse.ArgumentParser(description="Replay captured NPG notifications")
+    parser.add_argument("captures", nargs="+", help="device=path pairs")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 0 = max speed")
+    parser.add_argument("--offline", action="store_true", help="synchronous replay without the engine")
+    args = parser.parse_args()
+
+    captures = dict(item.split("=", 1) for item in args.captures)
+    devices = [dict(cfg) for cfg in npg.DEVICES if cfg["name"] in captures]
+    replay = Replay(args.speed)
+    engine = npg.AcquisitionEngine(devices, replay.transport(), send_keys=False)
+
+    start = time.perf_counter()
+    if args.offline:
+        for device in engine.devices:
+            replay_offline(device, captures[device.name])
+        engine.collect()
+    else:
+        asyncio.run(replay_engine(engine, captures, replay))
+    elapsed = time.perf_counter() - start
+
+    engine.log.flush()
+    for device in engine.devices:
+        print(f"{device.name}: {device.samples_total} samples in {elapsed:.2f} s "
+              f"({device.samples_total / elapsed:.0f} samples/s), "
+              f"{device.total_missing_samples} missing")
+    print(json.dumps(engine.latency.snapshot(), indent=2))
@@ -0,0 +1,70 @@
+import numpy as np
+
+###############################################
+# Single-Producer / Single-Consumer Ring Buffer
+###############################################
+
+# Fixed-size, preallocated buffer of decoded samples between the BLE
+# notification callback (producer) and the DSP/classifier stage (consumer).
+# Each sample carries its LSL timestamp and the perf_counter() arrival time
+# of its notification.
+#
+# head is only ever advanced by the producer and tail only by the consumer,
+# and each is published after the data it covers, so no lock is needed as
+# long as there is exactly one thread on each side. When the buffer is full
+# the newest samples are dropped and counted in overflows, because the
+# producer must never move tail.
+class RingBuffer:
+    def __init__(self, capacity, channels, dtype=np.int16):
+        self.capacity = capacity
+        self.counters = np.zeros(capacity, dtype=np.uint8)
+        self.samples = np.zeros((capacity, channels), dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.arrivals = np.zeros(capacity, dtype=np.float64)
+        self.head = 0         # total samples written
+        self.tail = 0         # total samples read
+        self.overflows = 0    # samples dropped because the buffer was full
+        self.high_water = 0   # largest fill level seen
+
+    def __len__(self):
+        return self.head - self.tail
+
+    # Producer side. Returns the number of samples actually stored.
+    def write(self, counters, samples, timestamps, arrival=0.0):
+        n = len(samples)
+        free = self.capacity - (self.head - self.tail)
+        if n > free:
+            self.overflows += n - free
+            n = free
+        if n == 0:
+            return 0
+
+        start = self.head % self.capacity
+        first = min(n, self.capacity - start)
+        self.counters[start:start + first] = counters[:first]
+        self.samples[start:start + first] = samples[:first]
+        self.timestamps[start:start + first] = timestamps[:first]
+        self.arrivals[start:start + first] = arrival
+        if first < n:
+            rest = n - first
+            self.counters[:rest] = counters[first:n]
+            self.samples[:rest] = samples[first:n]
+            self.timestamps[:rest] = timestamps[first:n]
+            self.arrivals[:rest] = arrival
+
+        self.head += n
+        fill = self.head - self.tail
+        if fill > self.high_water:
+            self.high_water = fill
+        return n
+
+    # Consumer side. Returns copies of up to max_count pending samples as
+    # (counters, samples, timestamps, arrivals).
+    def read(self, max_count=None):
+        n = self.head - self.tail
+        if max_count is not None:
+            n = min(n, max_count)
+        index = (self.tail + np.arange(n)) % self.capacity
+        block = self.counters[index], self.samples[index], self.timestamps[index], self.arrivals[index]
+        self.tail += n
+        return block
@@ -0,0 +1,127 @@
+import numpy as np
+
+###############################################
+# Sample Sequencer
+###############################################
+
+# Sits between the ring buffer and the DSP stage. It turns 8-bit packet
+# counters into a continuous sample sequence:
+#   - samples arriving up to reorder_window samples late are put back in
+#     order (this delays output by reorder_window samples; 0 disables it and
+#     later samples are dropped),
+#   - gaps of up to max_fill samples are filled with synthetic samples,
+#     either interpolated ("linear") or repeating the last value ("hold"),
+#     so the filters advance by the right number of samples,
+#   - longer gaps, or "none" as fill mode, are reported as a discontinuity
+#     so the caller can reset its filter state instead.
+# Counter jumps are disambiguated with the LSL timestamps, so a dropout of
+# more than 128 samples is not mistaken for a late sample.
+class Sequencer:
+    def __init__(self, fs, reorder_window=0, fill="linear", max_fill=25):
+        if fill not in ("linear", "hold", "none"):
+            raise ValueError(f"Unknown fill mode: {fill}")
+        self.fs = fs
+        self.reorder_window = reorder_window
+        self.fill = fill
+        self.max_fill = max_fill
+        self.reset()
+
+    def reset(self):
+        self.expected = None     # next unrolled counter to emit
+        self.last_seen = None    # highest unrolled counter received
+        self.last_ts = None      # timestamp of the last received sample
+        self.last_sample = None  # last emitted real sample
+        self.last_emitted_ts = None
+        self.pending = {}        # unrolled counter -> (sample, timestamp, arrival)
+        self.missing = 0
+        self.filled = 0
+        self.late_dropped = 0
+        self.gaps = []           # (expected, got) pairs seen in the last call
+
+    # Returns (unrolled counters, samples, timestamps, arrivals, synthetic
+    # mask, reset index). reset index is the output row before which the
+    # caller should reset its filters, or None.
+    def process(self, counters, samples, timestamps, arrivals):
+        self.gaps = []
+        samples = samples.astype(np.float64)
+        n = len(counters)
+        if self.expected is None:
+            self.expected = int(counters[0])
+            self.last_seen = self.expected - 1
+            self.last_ts = timestamps[0] - 1 / self.fs
+
+        # Fast path: nothing held back and the block continues the sequence.
+        # A dropout of a whole number of counter wraps also steps by 1, so
+        # the elapsed time has to rule that out, as in the slow path.
+        if (self.reorder_window == 0 and not self.pending
+                and (timestamps[0] - self.last_ts) * self.fs <= 128):
+            steps = np.diff(counters.astype(np.int64), prepend=self.last_seen % 256) % 256
+            if np.all(steps == 1):
+                unrolled = self.expected + np.arange(n)
+                self.expected += n
+                self.last_seen = self.expected - 1
+                self.last_ts = self.last_emitted_ts = timestamps[-1]
+                self.last_sample = samples[-1]
+                return unrolled, samples, timestamps, arrivals, np.zeros(n, dtype=bool), None
+
+        out = {"unrolled": [], "samples": [], "timestamps": [], "arrivals": [], "synthetic": [], "reset": None}
+        for i in range(n):
+            c = int(counters[i])
+            jump = (timestamps[i] - self.last_ts) * self.fs
+            if jump > 128:
+                # Long dropout: place the counter at the wrap nearest to the elapsed time
+                forward = (c - self.last_seen) % 256
+                u = self.last_seen + forward + 256 * max(round((jump - forward) / 256), 0)
+            else:
+                # Signed distance to the newest counter seen, in [-128, 127]
+                u = self.last_seen + ((c - self.last_seen + 128) % 256) - 128
+            if u < self.expected:
+                self.late_dropped += 1
+                continue
+            self.pending[u] = (samples[i], timestamps[i], arrivals[i])
+            if u > self.last_seen:
+                self.last_seen = u
+                self.last_ts = timestamps[i]
+            self.release(self.last_seen - self.reorder_window, out)
+
+        m = len(out["unrolled"])
+        if m == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros((0, samples.shape[1])), np.zeros(0),
+                    np.zeros(0), np.zeros(0, dtype=bool), None)
+        return (np.array(out["unrolled"]), np.array(out["samples"]), np.array(out["timestamps"]),
+                np.array(out["arrivals"]), np.array(out["synthetic"]), out["reset"])
+
+    # Emit pending samples up to counter `limit` in order, filling gaps.
+    def release(self, limit, out):
+        while self.pending:
+            u = min(self.pending)
+            if u > limit:
+                break
+            sample, ts, arrival = self.pending.pop(u)
+            gap = u - self.expected
+            if gap > 0:
+                self.missing += gap
+                self.gaps.append((self.expected, u))
+                if gap <= self.max_fill and self.fill != "none" and self.last_sample is not None:
+                    for k in range(1, gap + 1):
+                        frac = k / (gap + 1)
+                        if self.fill == "linear":
+                            value = self.last_sample + frac * (sample - self.last_sample)
+                        else:
+                            value = self.last_sample
+                        out["unrolled"].append(self.expected + k - 1)
+                        out["samples"].append(value)
+                        out["timestamps"].append(self.last_emitted_ts + frac * (ts - self.last_emitted_ts))
+                        out["arrivals"].append(arrival)
+                        out["synthetic"].append(True)
+                    self.filled += gap
+                else:
+                    out["reset"] = len(out["unrolled"])
+            out["unrolled"].append(u)
+            out["samples"].append(sample)
+            out["timestamps"].append(ts)
+            out["arrivals"].append(arrival)
+            out["synthetic"].append(False)
+            self.expected = u + 1
+            self.last_sample = sample
+            self.last_emitted_ts = ts
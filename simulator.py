@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import functools
+import random
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+import npg
+
+###############################################
+# Simulated Armband
+###############################################
+
+# Default gesture set: a burst on channel 1, then one on channel 3, matching
+# the two-gesture threshold rule. Each entry is the burst amplitude per
+# channel in ADC counts.
+DEFAULT_GESTURES = [[400, 40, 0], [0, 40, 400]]
+
+# Produces the NPG wire format: per sample an 8-bit counter and one
+# big-endian 16-bit value per channel, `block` samples per notification.
+#   rate, channels, block - stream shape
+#   gestures              - burst amplitude per channel for each gesture; the
+#                           device cycles rest, gesture 1, rest, gesture 2, ...
+#   rest_seconds, gesture_seconds - length of each phase
+#   noise, mains          - rest noise std and 50 Hz hum amplitude (ADC counts)
+#   first_counter         - counter of the first sample, to hit wraparound early
+#   loss                  - probability of dropping a notification
+#   disconnect_every      - mean seconds between link drops (None = never)
+#   connect_failure       - probability that a connection attempt fails
+# The device keeps sampling while nobody is connected, so a reconnect
+# resumes with a counter gap just like the hardware.
+class SimulatedDevice:
+    def __init__(self, name="NPG-SIM-0", address=None, rate=npg.SAMPLE_RATE, channels=npg.CHANNELS,
+                 block=npg.BLOCK_COUNT, gestures=None, rest_seconds=1.0, gesture_seconds=1.0,
+                 noise=15.0, mains=5.0, first_counter=0, loss=0.0, disconnect_every=None,
+                 connect_failure=0.0, seed=0):
+        self.name = name
+        self.address = address or f"SIM:{name}"
+        self.rate = rate
+        self.channels = channels
+        self.block = block
+        gestures = np.array(gestures if gestures is not None else DEFAULT_GESTURES, dtype=float)
+        self.gestures = np.zeros((len(gestures), channels))
+        width = min(channels, gestures.shape[1])
+        self.gestures[:, :width] = gestures[:, :width]
+        self.rest_seconds = rest_seconds
+        self.gesture_seconds = gesture_seconds
+        self.noise = noise
+        self.mains = mains
+        self.first_counter = first_counter
+        self.loss = loss
+        self.disconnect_every = disconnect_every
+        self.connect_failure = connect_failure
+        self.rng = np.random.default_rng(seed)
+        self.random = random.Random(seed)
+        self.dtype = npg.sample_dtype(channels)
+        self.boot = time.monotonic()
+        self.epoch = npg.local_clock()
+        self.sent = 0
+        self.dropped = 0
+        self.disconnects = 0
+
+    # Gesture class (0 = rest) at each sample index
+    def labels(self, index):
+        period = self.rest_seconds + self.gesture_seconds
+        t = index / self.rate
+        phase = (t % period) >= self.rest_seconds
+        cycle = (t // period).astype(np.int64) % len(self.gestures)
+        return np.where(phase, cycle + 1, 0)
+
+    # Raw ADC values for samples [start, start + n)
+    def generate(self, start, n):
+        index = np.arange(start, start + n)
+        t = index / self.rate
+        signal = self.rng.normal(0, self.noise, (n, self.channels))
+        signal += self.mains * np.sin(2 * np.pi * 50 * t)[:, None]
+        labels = self.labels(index)
+        active = labels > 0
+        if np.any(active):
+            amplitude = self.gestures[labels[active] - 1]
+            signal[active] += self.rng.normal(0, 1, amplitude.shape) * amplitude
+        return np.clip(2048 + signal, 0, 4095).astype(np.int16)
+
+    # One notification payload for the block starting at sample `start`
+    def packet(self, start):
+        packed = np.empty(self.block, dtype=self.dtype)
+        packed["counter"] = (self.first_counter + start + np.arange(self.block)) % 256
+        packed["channels"] = self.generate(start, self.block)
+        return packed.tobytes()
+
+    # Payloads for the first `count` blocks, for offline use
+    def packets(self, count):
+        return [self.packet(k * self.block) for k in range(count)]
+
+    # Sample index the device is at now, aligned to a block, when it has been
+    # running `speed` times faster than real time since boot
+    def current_index(self, speed=1.0):
+        index = int((time.monotonic() - self.boot) * self.rate * speed)
+        return index - index % self.block
+
+    # LSL time at which the device sampled `index`, on its own clock. With
+    # speed > 1 this runs ahead of local_clock(), so the engine sees gaps as
+    # long as they are in samples rather than in wall time.
+    def timestamp(self, index):
+        return self.epoch + index / self.rate
+
+    # Advertisement as seen by a scanner
+    def advertisement(self):
+        ble_device = SimpleNamespace(name=self.name, address=self.address)
+        adv = SimpleNamespace(local_name=self.name, service_uuids=[npg.SERVICE_UUID])
+        return ble_device, adv
+
+###############################################
+# Simulated Transport
+###############################################
+
+# Stands in for BleakClient. Streams once START has been written and
+# notifications are subscribed, at the device's rate times `speed`.
+class SimulatedClient:
+    def __init__(self, simulator, address, timeout=None, disconnected_callback=None):
+        self.simulator = simulator
+        self.address = getattr(address, "address", address)
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.device = None
+        self.started = False
+        self.handler = None
+        self.task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def connect(self):
+        device = self.simulator.devices.get(self.address)
+        if device is None:
+            raise ConnectionError(f"No simulated device at {self.address}")
+        await asyncio.sleep(self.simulator.connect_delay)
+        if device.random.random() < device.connect_failure:
+            raise ConnectionError(f"Simulated connection failure to {device.name}")
+        self.device = device
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.is_connected:
+            self.is_connected = False
+            if self.disconnected_callback is not None:
+                self.disconnected_callback(self)
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        if uuid == npg.CONTROL_CHAR_UUID:
+            command = bytes(data)
+            if command == b"START":
+                self.started = True
+            elif command == b"STOP":
+                self.started = False
+            self.update()
+
+    async def start_notify(self, uuid, handler):
+        self.handler = handler
+        self.update()
+
+    async def stop_notify(self, uuid):
+        self.handler = None
+        self.update()
+
+    def update(self):
+        streaming = self.started and self.handler is not None
+        if streaming and self.task is None:
+            self.task = asyncio.create_task(self.stream())
+        elif not streaming and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def stream(self):
+        device = self.device
+        speed = self.simulator.speed
+        interval = device.block / device.rate / speed
+        index = device.current_index(speed)
+        drop_at = None
+        if device.disconnect_every:
+            drop_at = time.monotonic() + device.random.expovariate(1 / device.disconnect_every) / speed
+        due = time.monotonic()
+        while True:
+            due += interval
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if drop_at is not None and time.monotonic() >= drop_at:
+                device.disconnects += 1
+                self.task = None
+                await self.disconnect()
+                return
+            payload = device.packet(index)
+            index += device.block
+            if device.random.random() < device.loss:
+                device.dropped += 1
+                continue
+            device.sent += 1
+            self.handler(self.address, bytearray(payload), device.timestamp(index - 1))
+
+# Stands in for BleakScanner, listing every simulated device.
+class SimulatedScanner:
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    async def discover(self, timeout=5.0, return_adv=False):
+        await asyncio.sleep(self.simulator.connect_delay)
+        found = {device.address: device.advertisement() for device in self.simulator.devices.values()}
+        if return_adv:
+            return found
+        return [ble_device for ble_device, _ in found.values()]
+
+    async def find_device_by_filter(self, filter_func, timeout=5.0):
+        await asyncio.sleep(self.simulator.connect_delay)
+        for device in self.simulator.devices.values():
+            ble_device, adv = device.advertisement()
+            if filter_func(ble_device, adv):
+                return ble_device
+        return None
+
+# A set of simulated armbands and the npg.Transport that reaches them.
+# speed > 1 runs every device faster than real time.
+class Simulator:
+    def __init__(self, devices, speed=1.0, connect_delay=0.05):
+        self.devices = {device.address: device for device in devices}
+        self.speed = speed
+        self.connect_delay = connect_delay
+
+    def transport(self):
+        return npg.Transport(functools.partial(SimulatedClient, self), SimulatedScanner(self))
+
+###############################################
+# Soak Test
+###############################################
+
+# Run an engine against simulated devices and report metrics and memory at
+# every interval, so growth over hours of reconnects shows up. Max RSS is
+# only available where the resource module is (not on Windows).
+async def soak(engine, simulator, hours, interval):
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    tracemalloc.start()
+    task = asyncio.create_task(engine.run())
+    start = time.monotonic()
+    baseline = None
+    while time.monotonic() - start < hours * 3600:
+        await asyncio.sleep(interval)
+        if task.done():
+            task.result()
+        current, peak = tracemalloc.get_traced_memory()
+        if baseline is None:
+            baseline = current
+        rss = ""
+        if resource is not None:
+            # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rss = f"  max RSS {maxrss / (1e6 if sys.platform == 'darwin' else 1e3):.1f} MB"
+        print(f"--- {time.monotonic() - start:8.0f} s  traced {current / 1e6:.2f} MB "
+              f"({(current - baseline) / 1e6:+.2f} MB)  peak {peak / 1e6:.2f} MB{rss}")
+        for device, sim in zip(engine.devices, simulator.devices.values()):
+            print(f"    {device.name}: {device.samples_total} samples, "
+                  f"{device.total_missing_samples} missing, {device.reconnects} reconnects, "
+                  f"{device.stalls} stalls, ring high water {device.buffer.high_water}, "
+                  f"sim sent {sim.sent} dropped {sim.dropped} disconnects {sim.disconnects}")
+    engine.request_stop()
+    await task
+    snapshot = tracemalloc.take_snapshot()
+    print("Top allocations:")
+    for stat in snapshot.statistics("lineno")[:10]:
+        print("   ", stat)
+
+# python simulator.py --devices 2 --hours 4 --loss 0.01 --disconnect-every 600
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak-test the acquisition engine against simulated NPG devices")
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--interval", type=float, default=60.0, help="report interval in seconds")
+    parser.add_argument("--speed", type=float, default=1.0, help="run the devices this many times faster")
+    parser.add_argument("--rate", type=int, default=npg.SAMPLE_RATE)
+    parser.add_argument("--channels", type=int, default=npg.CHANNELS)
+    parser.add_argument("--block", type=int, default=npg.BLOCK_COUNT)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--disconnect-every", type=float, default=None)
+    parser.add_argument("--connect-failure", type=float, default=0.0)
+    parser.add_argument("--first-counter", type=int, default=200)
+    args = parser.parse_args()
+
+    sims = [SimulatedDevice(f"NPG-SIM-{i}", rate=args.rate, channels=args.channels, block=args.block, loss=args.loss,
+                            disconnect_every=args.disconnect_every, connect_failure=args.connect_failure,
+                            first_counter=args.first_counter, seed=i) for i in range(args.devices)]
+    simulator = Simulator(sims, speed=args.speed)
+    configs = [{"name": f"sim{i}", "device_name": sim.name, "keys": ["k", "i"], "stream_name": f"NPG-sim{i}",
+                "channels": sim.channels, "sample_rate": sim.rate, "block": sim.block} for i, sim in enumerate(sims)]
+    engine = npg.AcquisitionEngine(configs, simulator.transport(), send_keys=False)
+    asyncio.run(soak(engine, simulator, args.hours, args.interval))
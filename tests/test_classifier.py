@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from classifier import ThresholdModel, load_model, save_model
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_threshold_model_round_trip(tmp_path, adaptive):
+    path = tmp_path / "model.npz"
+    save_model(path, ThresholdModel(0.3, (0, 1), adaptive=adaptive))
+    model = load_model(path)
+    assert isinstance(model, ThresholdModel)
+    assert model.threshold == pytest.approx(0.3)
+    assert model.channels == [0, 1]
+    assert model.adaptive is adaptive
+
+def test_threshold_model_without_adaptive_flag_loads_fixed(tmp_path):
+    path = tmp_path / "old.npz"
+    np.savez(path, kind="threshold", threshold=0.2, channels=np.array([0, 2]))
+    assert load_model(path).adaptive is False
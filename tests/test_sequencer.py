@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from sequencer import Sequencer
+
+FS = 250
+
+def block(start, n=10, channels=3):
+    index = np.arange(start, start + n)
+    counters = (index % 256).astype(np.uint8)
+    samples = np.tile(index[:, None], (1, channels)).astype(np.int16)
+    timestamps = index / FS
+    arrivals = timestamps.copy()
+    return counters, samples, timestamps, arrivals
+
+def test_continuous_stream_has_no_gaps():
+    seq = Sequencer(FS)
+    for start in range(0, 1000, 10):
+        unrolled, _, _, _, synthetic, reset_at = seq.process(*block(start))
+        assert list(unrolled) == list(range(start, start + 10))
+        assert not synthetic.any() and reset_at is None
+    assert seq.missing == 0
+
+# A dropout of a whole number of counter wraps leaves the counters looking
+# continuous; only the timestamps reveal it.
+@pytest.mark.parametrize("wraps", [1, 5])
+def test_dropout_of_whole_counter_wraps(wraps):
+    seq = Sequencer(FS)
+    seq.process(*block(0))
+    gap = 256 * wraps
+    unrolled, _, _, _, _, reset_at = seq.process(*block(10 + gap))
+    assert seq.missing == gap
+    assert unrolled[0] == 10 + gap
+    assert reset_at == 0
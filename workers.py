@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from types import SimpleNamespace
+import numpy as np
+import npg
+
+###############################################
+# Shared-Memory Ring Buffer
+###############################################
+
+# Same single-producer / single-consumer scheme as ringbuffer.RingBuffer, but
+# the records and the head/tail counters live in a SharedMemory segment so the
+# producer and consumer can be different processes. The consumer creates the
+# segment and the producer attaches to it by name. Each side only ever writes
+# its own counter, after the records it covers.
+HEADER = np.dtype([("head", "i8"), ("tail", "i8"), ("overflows", "i8"), ("high_water", "i8")])
+
+class SharedRingBuffer:
+    def __init__(self, dtype, capacity, name=None):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        size = HEADER.itemsize + self.dtype.itemsize * capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creator may unlink the segment; stop this process's
+            # resource tracker from removing it when the worker exits.
+            if os.name == "posix":
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.name = self.shm.name
+        self.header = np.ndarray((), dtype=HEADER, buffer=self.shm.buf)
+        self.records = np.ndarray(capacity, dtype=self.dtype, buffer=self.shm.buf, offset=HEADER.itemsize)
+        if name is None:
+            self.header[...] = 0
+
+    @property
+    def overflows(self):
+        return int(self.header["overflows"])
+
+    @property
+    def high_water(self):
+        return int(self.header["high_water"])
+
+    def __len__(self):
+        return int(self.header["head"] - self.header["tail"])
+
+    # Producer side. Returns the number of records actually stored.
+    def write(self, records):
+        head = int(self.header["head"])
+        n = len(records)
+        free = self.capacity - (head - int(self.header["tail"]))
+        if n > free:
+            self.header["overflows"] += n - free
+            n = free
+        if n == 0:
+            return 0
+        index = (head + np.arange(n)) % self.capacity
+        self.records[index] = records[:n]
+        self.header["head"] = head + n
+        fill = head + n - int(self.header["tail"])
+        if fill > self.header["high_water"]:
+            self.header["high_water"] = fill
+        return n
+
+    # Consumer side. Returns a copy of up to max_count pending records.
+    def read(self, max_count=None):
+        tail = int(self.header["tail"])
+        n = int(self.header["head"]) - tail
+        if max_count is not None:
+            n = min(n, max_count)
+        records = self.records[(tail + np.arange(n)) % self.capacity]
+        self.header["tail"] = tail + n
+        return records
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+# One conditioned sample as handed from a worker to the main process
+def record_dtype(channels):
+    return np.dtype([
+        ("raw", "i2", (channels,)),
+        ("filtered", "f8", (channels,)),
+        ("enveloped", "f8", (channels,)),
+        ("active", "?", (channels,)),
+        ("reset", "?"),          # first sample after a discontinuity
+        ("timestamp", "f8"),
+        ("arrival", "f8"),
+    ])
+
+###############################################
+# Worker Process
+###############################################
+
+# Each worker runs an AcquisitionEngine for one device: BLE, decoding,
+# sequencing, filters, envelope, trigger levels and LSL. The conditioned
+# samples go into the shared ring; classification and key output stay in the
+# main process, which owns the keyboard, the UI and the calibration recorder.
+#
+# Control messages are JSON lines over the worker's stdin ("stop"), status
+# reports are JSON lines over its stdout. Ordinary prints go to stderr.
+
+# Seconds between status reports
+STATUS_INTERVAL = 0.5
+
+# Device whose decision stage writes into the shared ring instead
+class WorkerDevice(npg.Device):
+    def __init__(self, **cfg):
+        super().__init__(**cfg)
+        self.sink = None
+        self.pending_reset = False
+
+    def reset_decisions(self):
+        self.pending_reset = True
+
+    def decide(self, channels, filtered, enveloped, active, timestamps, arrivals):
+        records = np.empty(len(filtered), dtype=self.sink.dtype)
+        records["raw"] = np.round(channels)
+        records["filtered"] = filtered
+        records["enveloped"] = enveloped
+        records["active"] = active
+        records["reset"] = False
+        records["reset"][0] = self.pending_reset
+        records["timestamp"] = timestamps
+        records["arrival"] = arrivals
+        self.pending_reset = False
+        self.sink.write(records)
+
+    def status(self):
+        baseline = self.baseline
+        return {
+            "samples_total": self.samples_total,
+            "total_missing_samples": self.total_missing_samples,
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "reconnect_seconds": self.reconnect_durations[-1] if self.reconnect_durations else None,
+            "stalls": self.stalls,
+            "callbacks": self.callbacks,
+            "callback_seconds": self.callback_seconds,
+            "envelopes": self.envelopes.tolist(),
+            "baseline": {"ready": bool(baseline.ready), "on": baseline.on.tolist(), "off": baseline.off.tolist()},
+            "latency": self.latency.snapshot().get(self.name, {}),
+        }
+
+# Transport of a worker: real BLE, or a simulated armband when the device
+# config has a "simulate" entry (keyword arguments for SimulatedDevice).
+def make_transport(cfg, simulate):
+    if simulate is None:
+        return npg.BLE
+    import simulator
+    sim = simulator.SimulatedDevice(cfg["device_name"] or cfg["name"], rate=cfg.get("sample_rate", npg.SAMPLE_RATE),
+                                    channels=cfg.get("channels", npg.CHANNELS),
+                                    block=cfg.get("block", npg.BLOCK_COUNT), **simulate)
+    return simulator.Simulator([sim]).transport()
+
+def worker_main(cfg, ring_name, capacity, simulate=None):
+    status_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    engine = npg.AcquisitionEngine([cfg], make_transport(cfg, simulate), send_keys=False,
+                                   device_class=WorkerDevice)
+    device = engine.devices[0]
+    device.sink = SharedRingBuffer(record_dtype(device.channels), capacity, ring_name)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+
+        # stdin closes when the main process exits, which also stops the worker
+        def control():
+            for line in sys.stdin:
+                if json.loads(line).get("command") == "stop":
+                    break
+            loop.call_soon_threadsafe(stopped.set)
+        threading.Thread(target=control, daemon=True).start()
+
+        task = asyncio.create_task(engine.run())
+        while not stopped.is_set():
+            try:
+                await asyncio.wait_for(stopped.wait(), STATUS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if task.done():
+                task.result()
+            status_out.write(json.dumps(device.status()) + "\n")
+            status_out.flush()
+        engine.request_stop()
+        await task
+        status_out.write(json.dumps(device.status()) + "\n")
+        status_out.flush()
+
+    try:
+        asyncio.run(run())
+    finally:
+        engine.log.flush()
+        device.sink.close()
+
+###############################################
+# Main-Process Side
+###############################################
+
+# Worker counters that keep counting across worker restarts
+COUNTERS = ["samples_total", "total_missing_samples", "reconnects", "stalls", "callbacks", "callback_seconds"]
+
+# Stand-in for a device running in a worker. Classifies the conditioned
+# samples from the shared ring and mirrors the worker's counters and latency
+# statistics from its status reports, so the engine's metrics and the UI
+# read it like a Device.
+class RemoteDevice(npg.Device):
+    def __init__(self, simulate=None, **cfg):
+        self.worker_config = {key: value for key, value in cfg.items() if key != "model"}
+        self.simulate = simulate
+        cfg = dict(cfg, lsl_mode="off", capture=None)
+        super().__init__(**cfg)
+        capacity = self.buffer.capacity
+        self.buffer = SharedRingBuffer(record_dtype(self.channels), capacity)
+        self.baseline = SimpleNamespace(ready=False, on=np.zeros(self.channels), off=np.zeros(self.channels),
+                                        active=np.zeros(self.channels, dtype=bool))
+        self.process = None
+        self.reader = None
+        # Counter values carried over from earlier workers of this device
+        self.offsets = {}
+
+    def spawn(self):
+        self.offsets = {key: getattr(self, key) for key in COUNTERS}
+        command = [sys.executable, os.path.abspath(__file__), "--worker",
+                   json.dumps({"config": self.worker_config, "ring": self.buffer.name,
+                               "capacity": self.buffer.capacity, "simulate": self.simulate})]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.reader = threading.Thread(target=self.read_status, args=(self.process,), daemon=True)
+        self.reader.start()
+
+    def read_status(self, process):
+        for line in process.stdout:
+            try:
+                self.apply_status(json.loads(line))
+            except ValueError:
+                pass
+        self.connected = False
+
+    def apply_status(self, status):
+        offsets = self.offsets
+        if status["reconnects"] + offsets["reconnects"] > self.reconnects and status["reconnect_seconds"] is not None:
+            self.reconnect_durations.append(status["reconnect_seconds"])
+        for key in COUNTERS:
+            setattr(self, key, status[key] + offsets[key])
+        self.connected = status["connected"]
+        self.envelopes[:] = status["envelopes"]
+        baseline = status["baseline"]
+        self.baseline.ready = baseline["ready"]
+        self.baseline.on = np.array(baseline["on"])
+        self.baseline.off = np.array(baseline["off"])
+        # Decode and envelope latencies are measured in the worker
+        if self.latency is not None:
+            self.latency.merge(self.name, status["latency"])
+
+    def send(self, command):
+        try:
+            self.process.stdin.write(json.dumps({"command": command}) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+
+    def stop_worker(self, timeout=5.0):
+        if self.process is None:
+            return
+        self.send("stop")
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdin.close()
+        self.reader.join()
+        self.process = None
+
+    def process_records(self, records):
+        if len(records) == 0:
+            return
+        if records["reset"][0]:
+            self.classifier.reset()
+        self.decide(records["raw"], records["filtered"], records["enveloped"], records["active"],
+                    records["timestamp"], records["arrival"])
+
+# Engine that runs every device in its own worker process, with the same
+# start/stop lifecycle as AcquisitionEngine. The consumer thread polls the
+# shared rings, since a threading.Event cannot be set from another process.
+# Workers that exit unexpectedly are restarted.
+POLL_INTERVAL = 0.002
+
+class IsolatedEngine(npg.AcquisitionEngine):
+    def __init__(self, devices=None, send_keys=True):
+        super().__init__(devices, transport=None, send_keys=send_keys, device_class=RemoteDevice)
+        self.closed = False
+
+    def consume(self):
+        while self.consuming:
+            time.sleep(POLL_INTERVAL)
+            for device in self.devices:
+                if len(device.buffer):
+                    device.process_records(device.buffer.read())
+
+    async def start_devices(self):
+        for device in self.devices:
+            device.spawn()
+        return [asyncio.create_task(self.supervise())]
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(1.0)
+            for device in self.devices:
+                if device.process.poll() is not None:
+                    print(f"[{device.name}] Worker exited with code {device.process.returncode}, restarting")
+                    device.spawn()
+
+    # Workers send STOP to their devices and exit
+    async def stop_devices(self):
+        await asyncio.gather(*(asyncio.to_thread(device.stop_worker) for device in self.devices))
+
+    def start(self):
+        if self.closed:
+            raise RuntimeError("IsolatedEngine has been closed")
+        return super().start()
+
+    # Stop the engine and free the shared memory. The engine cannot be
+    # started again afterwards.
+    def close(self):
+        self.stop()
+        if self.closed:
+            return
+        for device in self.devices:
+            device.stop_worker()
+            device.buffer.close()
+            device.buffer.unlink()
+        self.closed = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NPG acquisition worker (started by IsolatedEngine)")
+    parser.add_argument("--worker", required=True, help="JSON with config, ring, capacity and simulate")
+    args = json.loads(parser.parse_args().worker)
+    worker_main(args["config"], args["ring"], args["capacity"], args["simulate"])